@@ -1,13 +1,28 @@
 import os
-import json
 import uuid
-from fastapi import APIRouter, HTTPException
+import asyncio
+import contextlib
+import fcntl
+import functools
+import mmap
+import tempfile
+import threading
+import multiprocessing
+import aiofiles
+import orjson
+import zstandard as zstd
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Response
 from app.services.transformers import (
     validate_create_itinerary_payload,
     transform_frontend_payload,
     transform_response_to_frontend,
     transform_poi_to_frontend,
 )
+from app.core.config import settings
 from app.services.maut import run_pipeline
 from app.services.pipeline import run_full_pipeline
 from app.utils.logger import get_logger
@@ -15,47 +30,283 @@ from app.utils.logger import get_logger
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api", tags=["itinerary"])
 
+INDEX_FILENAME = "_index.json"
+INDEX_LOCK_FILENAME = "_index.lock"
+ITINERARY_SUFFIX = ".json.zst"
+LEGACY_SUFFIX = ".json"  # uncompressed files written before zstd storage
+ZSTD_LEVEL = 6
+_index_lock = asyncio.Lock()  # serializes this process's coroutines before flock
+
+
+# MAUT scoring, CVRPTW solving and ACO are CPU-bound: run them in worker
+# processes so they neither block the event loop nor contend for the GIL.
+# "spawn" avoids forking a process that already runs OR-Tools/numba threads.
+# Module-level caches and the OSRM circuit breaker are per worker process.
+def _new_pipeline_pool() -> ProcessPoolExecutor:
+    """Create the pipeline worker pool (at import, and after a worker dies)."""
+    return ProcessPoolExecutor(
+        max_workers=settings.PIPELINE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+_pipeline_pool = _new_pipeline_pool()
+_pipeline_pool_lock = threading.Lock()
+
+
+def shutdown_pipeline_pool() -> None:
+    """Stop pipeline worker processes (called on app shutdown)."""
+    _pipeline_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _replace_broken_pipeline_pool(broken: ProcessPoolExecutor) -> None:
+    """Swap in a fresh pool unless another request already replaced it."""
+    global _pipeline_pool
+    with _pipeline_pool_lock:
+        if _pipeline_pool is broken:
+            logger.warning("Pipeline worker process died, restarting the pool")
+            broken.shutdown(wait=False, cancel_futures=True)
+            _pipeline_pool = _new_pipeline_pool()
+
+
+async def _run_in_pipeline_pool(fn, *args):
+    """
+    Run fn(*args) in a pipeline worker process.
+
+    A worker that dies (OOM kill, native crash) breaks the whole executor,
+    so the pool is replaced and the call retried once on the fresh pool;
+    if that fails too, BrokenProcessPool fails only this request.
+    """
+    loop = asyncio.get_running_loop()
+    for attempt in range(2):
+        pool = _pipeline_pool
+        try:
+            return await loop.run_in_executor(pool, fn, *args)
+        except BrokenProcessPool:
+            _replace_broken_pipeline_pool(pool)
+            if attempt:
+                raise
+
 
 # Storage Helpers
 
 
-def get_storage_dir() -> str:
+@functools.lru_cache(maxsize=1)
+def get_storage_dir() -> Path:
     """Get absolute path to itineraries storage directory."""
-    return os.path.join(
-        os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
-        "storage",
-        "itineraries",
-    )
+    return Path(__file__).resolve().parents[2] / "storage" / "itineraries"
+
+
+def get_itinerary_path(itin_id: str) -> Path:
+    """Get storage path for a single itinerary."""
+    return get_storage_dir() / f"{itin_id}{ITINERARY_SUFFIX}"
+
+
+def get_legacy_itinerary_path(itin_id: str) -> Path:
+    """Get path of an itinerary stored as plain JSON (pre-zstd)."""
+    return get_storage_dir() / f"{itin_id}{LEGACY_SUFFIX}"
+
+
+def _find_itinerary_path(itin_id: str) -> Optional[Path]:
+    """Stored file for an itinerary: compressed first, then legacy JSON."""
+    for path in (get_itinerary_path(itin_id), get_legacy_itinerary_path(itin_id)):
+        if path.exists():
+            return path
+    return None
+
 
+def get_index_path() -> Path:
+    """Get path to the itinerary metadata index."""
+    return get_storage_dir() / INDEX_FILENAME
 
-def save_itinerary(itin_id: str, data: dict) -> None:
-    """Persist itinerary to local JSON storage."""
-    storage_dir = get_storage_dir()
-    os.makedirs(storage_dir, exist_ok=True)
 
-    storage_path = os.path.join(storage_dir, f"{itin_id}.json")
-    with open(storage_path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+get_storage_dir().mkdir(parents=True, exist_ok=True)
 
+
+def _fsync_dir(path: Path) -> None:
+    """fsync a directory so a rename inside it survives a crash."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+async def _atomic_write(path: Path, payload: bytes) -> None:
+    """
+    Write to a temp file, fdatasync, then os.replace over the target.
+
+    Each writer gets its own temp file in the target's directory, so
+    overlapping saves of the same path never share (or rename away) another
+    writer's half-written file.
+    """
+    fd, tmp_name = await asyncio.to_thread(
+        tempfile.mkstemp, dir=path.parent, prefix=f"{path.name}.", suffix=".tmp"
+    )
+    try:
+        async with aiofiles.open(fd, "wb") as f:
+            await f.write(payload)
+            await f.flush()
+            await asyncio.to_thread(os.fdatasync, f.fileno())
+        await asyncio.to_thread(os.replace, tmp_name, path)
+    except BaseException:
+        await asyncio.to_thread(Path(tmp_name).unlink, missing_ok=True)
+        raise
+    await asyncio.to_thread(_fsync_dir, path.parent)
+
+
+async def save_itinerary(itin_id: str, data: dict) -> None:
+    """Persist itinerary as zstd-compressed JSON (crash-safe replace)."""
+    storage_path = get_itinerary_path(itin_id)
+    await _atomic_write(
+        storage_path,
+        zstd.compress(orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS), ZSTD_LEVEL),
+    )
+    # Superseded by the compressed copy
+    await asyncio.to_thread(get_legacy_itinerary_path(itin_id).unlink, missing_ok=True)
+
+    await _update_index(itin_id, data)
     logger.info(f"Itinerary saved: {storage_path}")
 
 
-def load_itinerary(itin_id: str) -> dict:
-    """Load itinerary from local JSON storage."""
-    storage_path = os.path.join(get_storage_dir(), f"{itin_id}.json")
+def _read_itinerary_file(path: Path) -> dict:
+    """Parse a stored itinerary straight out of the page cache (no bytes copy)."""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+            with memoryview(mm) as view:
+                if path.name.endswith(ITINERARY_SUFFIX):
+                    return orjson.loads(zstd.decompress(view))
+                return orjson.loads(view)
 
-    if not os.path.exists(storage_path):
+
+async def load_itinerary(itin_id: str) -> dict:
+    """Load itinerary from local storage (zstd or legacy plain JSON)."""
+    storage_path = _find_itinerary_path(itin_id)
+
+    if storage_path is None:
         raise FileNotFoundError(f"Itinerary {itin_id} not found")
 
-    with open(storage_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return await asyncio.to_thread(_read_itinerary_file, storage_path)
+
+
+# Metadata Index
+
+
+@contextlib.asynccontextmanager
+async def _locked_index():
+    """
+    Hold the index lock across coroutines and server worker processes.
+
+    The asyncio lock orders this process's coroutines; the flock on a
+    sidecar file orders read-modify-write cycles between uvicorn workers,
+    which each have their own asyncio lock.
+    """
+    async with _index_lock:
+        fd = await asyncio.to_thread(
+            os.open,
+            get_storage_dir() / INDEX_LOCK_FILENAME,
+            os.O_RDWR | os.O_CREAT,
+            0o644,
+        )
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+
+
+def _index_entry(itin_id: str, data: dict) -> dict:
+    """Summary stored in the index: everything except the plan and ideas."""
+    meta = data.get("meta") or {}
+    return {
+        "itin_id": itin_id,
+        "status": data.get("status"),
+        "meta": {k: v for k, v in meta.items() if k != "ideas"},
+    }
+
+
+async def _write_index(index: dict) -> None:
+    """
+    Atomically replace the index file.
+
+    Stored as a JSON array of entries so list_itineraries can send it as-is.
+    """
+    await _atomic_write(get_index_path(), orjson.dumps(list(index.values())))
+
+
+def _read_itinerary_entry(entry: os.DirEntry) -> Optional[dict]:
+    """Read one stored itinerary's index entry; None if unreadable."""
+    itin_id = entry.name.removesuffix(ITINERARY_SUFFIX).removesuffix(LEGACY_SUFFIX)
+    try:
+        return _index_entry(itin_id, _read_itinerary_file(Path(entry.path)))
+    except Exception as e:
+        logger.warning(f"Failed to index itinerary {entry.name}: {e}")
+        return None
+
+
+def _scan_itineraries(storage_dir: Path) -> list:
+    """
+    Read all stored itineraries' index entries.
+
+    scandir reuses the directory listing's file type instead of a stat per
+    file, and reads are overlapped on a small thread pool since they are
+    IO-bound.
+    """
+    with os.scandir(storage_dir) as it:
+        entries = [
+            e
+            for e in it
+            if e.name.endswith((ITINERARY_SUFFIX, LEGACY_SUFFIX))
+            and e.name != INDEX_FILENAME
+            and e.is_file()
+        ]
+    # Legacy files first so a compressed copy of the same itinerary wins
+    entries.sort(key=lambda e: e.name.endswith(ITINERARY_SUFFIX))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        return [e for e in pool.map(_read_itinerary_entry, entries) if e]
+
+
+async def _rebuild_index() -> dict:
+    """Build the index from stored itineraries (first run or lost index)."""
+    entries = await asyncio.to_thread(_scan_itineraries, get_storage_dir())
+    index = {entry["itin_id"]: entry for entry in entries}
+
+    await _write_index(index)
+    logger.info(f"Rebuilt itinerary index: {len(index)} entries")
+    return index
+
+
+async def _read_index() -> dict:
+    """Load the index keyed by itin_id, rebuilding it if missing.
+
+    Caller holds _locked_index().
+    """
+    index_path = get_index_path()
+    if not index_path.exists():
+        return await _rebuild_index()
+
+    async with aiofiles.open(index_path, "rb") as f:
+        entries = orjson.loads(await f.read())
+    return {entry["itin_id"]: entry for entry in entries}
+
+
+async def _update_index(itin_id: str, data: Optional[dict]) -> None:
+    """Upsert an itinerary's index entry, or remove it when data is None."""
+    async with _locked_index():
+        index = await _read_index()
+        if data is None:
+            index.pop(itin_id, None)
+        else:
+            index[itin_id] = _index_entry(itin_id, data)
+        await _write_index(index)
 
 
 # API Endpoints
 
 
 @router.post("/itinerary/create")
-def create_itinerary(payload: dict):
+async def create_itinerary(payload: dict):
     """
     Create a new itinerary from frontend form payload.
 
@@ -105,21 +356,26 @@ def create_itinerary(payload: dict):
         )
 
         # 3. Run MAUT pipeline
-        maut_output = run_pipeline(maut_request)
+        maut_output = await _run_in_pipeline_pool(run_pipeline, maut_request)
         logger.info(f"MAUT output: {len(maut_output.get('places', []))} POIs selected")
 
         # 3.5. Enrich MAUT output with dates and num_days for CVRPTW compatibility
         maut_output["meta"]["dates"] = payload.get("dates", {})
         maut_output["meta"]["num_days"] = maut_request["num_days"]
 
-        # 4. Extract hotel information if exist (still on testing mode)
+        # 4. Single pass over places: transform for frontend and pick the
+        #    first accommodation as hotel (still on testing mode)
         places = maut_output.get("places", [])
-        accommodations = [
-            p for p in places if "accommodation" in p.get("poi_roles", [])
-        ]
-
-        if accommodations:
-            hotel_poi = accommodations[0]
+        items = []
+        hotel_poi = None
+        for p in places:
+            items.append(transform_poi_to_frontend(p))
+            if hotel_poi is None and "accommodation" in p.get("poi_roles", ()):
+                hotel_poi = p
+
+        # None lets the pipeline fall back to MAUT's selected_hotel
+        hotel = None
+        if hotel_poi:
             coords = hotel_poi.get("coordinates") or {}
             hotel = {
                 "id": hotel_poi["id"],
@@ -130,13 +386,16 @@ def create_itinerary(payload: dict):
             logger.info(f"Using accommodation from MAUT: {hotel['name']}")
 
         # 5. Run full pipeline (CVRPTW + ACO)
-        pipeline_output = run_full_pipeline(
-            maut_output=maut_output,
-            hotel=hotel,
-            pacing=maut_request.get("pacing", "balanced"),
-            mandatory=None,
-            time_limit_sec=20,
-            use_aco=True,  # Enable ACO optimization
+        pipeline_output = await _run_in_pipeline_pool(
+            functools.partial(
+                run_full_pipeline,
+                maut_output=maut_output,
+                hotel=hotel,
+                pacing=maut_request.get("pacing", "balanced"),
+                mandatory=None,
+                time_limit_sec=20,
+                use_aco=True,  # Enable ACO optimization
+            ),
         )
 
         # 6. Transform pipeline output → frontend plan
@@ -144,7 +403,7 @@ def create_itinerary(payload: dict):
             plan = {
                 "status": "ok",
                 "days": pipeline_output.get("days", []),
-                "items": [transform_poi_to_frontend(p) for p in places],
+                "items": items,
                 "meta": pipeline_output.get("meta", {}),
             }
         else:
@@ -170,7 +429,7 @@ def create_itinerary(payload: dict):
         }
 
         # 6. Persist to storage
-        save_itinerary(itin_id, result)
+        await save_itinerary(itin_id, result)
 
         return result
 
@@ -190,7 +449,7 @@ def create_itinerary(payload: dict):
 
 
 @router.get("/itinerary/{itin_id}")
-def get_itinerary(itin_id: str):
+async def get_itinerary(itin_id: str):
     """
     Retrieve an existing itinerary by ID.
 
@@ -204,7 +463,7 @@ def get_itinerary(itin_id: str):
         HTTPException: 404 if not found, 500 for errors
     """
     try:
-        return load_itinerary(itin_id)
+        return await load_itinerary(itin_id)
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Itinerary not found")
     except Exception as e:
@@ -213,37 +472,37 @@ def get_itinerary(itin_id: str):
 
 
 @router.get("/itineraries")
-def list_itineraries():
+async def list_itineraries():
     """
     List all stored itineraries.
 
+    Sends the metadata index bytes as-is: no per-itinerary parsing and no
+    re-encoding of the list.
+
     Returns:
-        List of itinerary metadata
+        List of itinerary summaries: {"itin_id", "status", "meta"} (no plan)
     """
     try:
-        storage_dir = get_storage_dir()
-        if not os.path.exists(storage_dir):
+        if not get_storage_dir().exists():
             return []
 
-        itineraries = []
-        for filename in os.listdir(storage_dir):
-            if filename.endswith(".json"):
-                try:
-                    itin_id = filename.replace(".json", "")
-                    data = load_itinerary(itin_id)
-                    itineraries.append(data)
-                except Exception as e:
-                    logger.warning(f"Failed to load itinerary {filename}: {e}")
-                    continue
-
-        return itineraries
+        index_path = get_index_path()
+        if not index_path.exists():
+            async with _locked_index():
+                await _read_index()
+
+        # Index is replaced atomically, so a plain read never sees a partial file
+        async with aiofiles.open(index_path, "rb") as f:
+            content = await f.read()
+
+        return Response(content=content, media_type="application/json")
     except Exception as e:
         logger.exception("Failed to list itineraries")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.delete("/itinerary/{itin_id}")
-def delete_itinerary(itin_id: str):
+async def delete_itinerary(itin_id: str):
     """
     Delete an itinerary by ID.
 
@@ -257,12 +516,12 @@ def delete_itinerary(itin_id: str):
         HTTPException: 404 if not found, 500 for errors
     """
     try:
-        storage_path = os.path.join(get_storage_dir(), f"{itin_id}.json")
-
-        if not os.path.exists(storage_path):
+        if _find_itinerary_path(itin_id) is None:
             raise HTTPException(status_code=404, detail="Itinerary not found")
 
-        os.remove(storage_path)
+        for path in (get_itinerary_path(itin_id), get_legacy_itinerary_path(itin_id)):
+            await asyncio.to_thread(path.unlink, missing_ok=True)
+        await _update_index(itin_id, None)
         logger.info(f"Deleted itinerary {itin_id}")
 
         return {"status": "deleted", "itin_id": itin_id}
@@ -274,7 +533,7 @@ def delete_itinerary(itin_id: str):
 
 
 @router.post("/itinerary/{itin_id}/add-poi")
-def add_poi_to_itinerary(itin_id: str, payload: dict):
+async def add_poi_to_itinerary(itin_id: str, payload: dict):
     """
     Add a POI to an itinerary's ideas list.
 
@@ -296,53 +555,50 @@ def add_poi_to_itinerary(itin_id: str, payload: dict):
 
         # Load existing itinerary
         try:
-            data = load_itinerary(itin_id)
+            data = await load_itinerary(itin_id)
         except FileNotFoundError:
             raise HTTPException(status_code=404, detail="Itinerary not found")
 
         # Initialize ideas array if needed
-        if "meta" not in data:
-            data["meta"] = {}
-        if "ideas" not in data["meta"]:
-            data["meta"]["ideas"] = []
+        ideas = data.setdefault("meta", {}).setdefault("ideas", [])
+
+        # Already in ideas: nothing to fetch or save
+        if poi_id in {item.get("id") for item in ideas}:
+            logger.info(f"POI {poi_id} already in itinerary {itin_id}")
+            return data
 
         # Fetch POI details
         from app.api.pois import get_poi_by_id
 
         try:
-            poi_response = get_poi_by_id(poi_id)
+            poi_response = await asyncio.to_thread(get_poi_by_id, poi_id)
             if not poi_response or "data" not in poi_response:
                 raise HTTPException(status_code=404, detail=f"POI {poi_id} not found")
 
             poi_details = poi_response["data"]
-
-            # Check if POI already in ideas
-            existing_ids = [item.get("id") for item in data["meta"]["ideas"]]
-            if poi_id not in existing_ids:
-                # Add POI to ideas
-                idea_item = {
-                    "id": poi_details.get("id"),
-                    "name": poi_details.get("name"),
-                    "category": poi_details.get("category"),
-                    "rating": poi_details.get("rating"),
-                    "location": poi_details.get("location"),
-                    "images": poi_details.get("images", []),
-                    "image": poi_details.get("images", [None])[0],
-                }
-                data["meta"]["ideas"].append(idea_item)
-
-                # Save updated itinerary
-                save_itinerary(itin_id, data)
-                logger.info(f"Added POI {poi_id} to itinerary {itin_id}")
-            else:
-                logger.info(f"POI {poi_id} already in itinerary {itin_id}")
-
         except HTTPException:
             raise
         except Exception as e:
             logger.error(f"Failed to fetch POI details: {e}")
             raise HTTPException(status_code=500, detail="Failed to fetch POI details")
 
+        # Add POI to ideas
+        ideas.append(
+            {
+                "id": poi_details.get("id"),
+                "name": poi_details.get("name"),
+                "category": poi_details.get("category"),
+                "rating": poi_details.get("rating"),
+                "location": poi_details.get("location"),
+                "images": poi_details.get("images", []),
+                "image": poi_details.get("images", [None])[0],
+            }
+        )
+
+        # Save updated itinerary
+        await save_itinerary(itin_id, data)
+        logger.info(f"Added POI {poi_id} to itinerary {itin_id}")
+
         return data
 
     except HTTPException:
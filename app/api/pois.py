@@ -1,13 +1,27 @@
+import threading
+import orjson
 from typing import Optional
-from fastapi import APIRouter, Query, HTTPException
+from cachetools import TTLCache
+from fastapi import APIRouter, Query, HTTPException, Response
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 from app.db.supabase_client import get_supabase
-from app.services.transformers import transform_poi_to_frontend
+from app.services.transformers import (
+    transform_poi_to_frontend,
+    transform_pois_to_frontend,
+)
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 router = APIRouter(prefix="/api", tags=["pois"])
 
+# POI rows rarely change; cache transformed lookups to skip the Supabase round-trip.
+# Entries are orjson bytes, so no caller can mutate a cached POI in place.
+_poi_cache: TTLCache = TTLCache(
+    maxsize=settings.POI_CACHE_SIZE, ttl=settings.POI_CACHE_TTL
+)
+_poi_cache_lock = threading.Lock()
+
 UI_TO_ROLE = {
     "attractions": "attraction",
     "restaurants": "meal",
@@ -52,38 +66,55 @@ def list_pois(
         data = resp.data or []
         total = resp.count or 0
 
-        pois = [transform_poi_to_frontend(p) for p in data]
-        return {
-            "status": "success",
-            "count": total,
-            "data": pois,
-        }
+        pois = transform_pois_to_frontend(data)
+        # Rows are plain JSON types already: skip FastAPI's jsonable_encoder walk
+        return ORJSONResponse(
+            {
+                "status": "success",
+                "count": total,
+                "data": pois,
+            }
+        )
     except Exception as e:
         logger.exception("Error listing POIs")
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def get_poi_by_id(poi_id: str):
-    """Helper function to get POI data by ID (for internal use)"""
+def _get_poi_json(poi_id: str) -> Optional[bytes]:
+    """{"status", "data"} POI response as JSON bytes, cached; None if not found."""
+    with _poi_cache_lock:
+        cached = _poi_cache.get(poi_id)
+    if cached is not None:
+        return cached
+
     try:
         supabase = get_supabase()
         resp = supabase.table("pois").select("*").eq("id", poi_id).single().execute()
         if not resp.data:
             return None
         poi = transform_poi_to_frontend(resp.data)
-        return {"status": "success", "data": poi}
+        result = orjson.dumps({"status": "success", "data": poi})
+        with _poi_cache_lock:
+            _poi_cache[poi_id] = result
+        return result
     except Exception as e:
         logger.error(f"Error fetching POI {poi_id}: {e}")
         return None
 
 
+def get_poi_by_id(poi_id: str):
+    """Helper function to get POI data by ID (for internal use), copied per call"""
+    result = _get_poi_json(poi_id)
+    return None if result is None else orjson.loads(result)
+
+
 @router.get("/pois/{poi_id}")
 def get_poi(poi_id: str):
     """Get a specific POI by ID"""
-    result = get_poi_by_id(poi_id)
+    result = _get_poi_json(poi_id)
     if result is None:
         raise HTTPException(status_code=404, detail="POI not found")
-    return result
+    return Response(content=result, media_type="application/json")
 
 
 @router.get("/search")
@@ -93,19 +124,25 @@ def search_pois(
     offset: int = Query(0, ge=0),
 ):
     """
-    Full-text-ish search over name/description/address.
+    Full-text search over name/description/address (websearch syntax).
     - Paginates and returns total count.
     - Keeps UI simple (no category filter here)
     """
     try:
         if not q.strip():
-            return {"status": "success", "query": q, "count": 0, "data": []}
+            return ORJSONResponse(
+                {"status": "success", "query": q, "count": 0, "data": []}
+            )
 
         supabase = get_supabase()
 
-        # Note: ilike across a few fields
-        filt = f"name.ilike.%{q}%,descriptions.ilike.%{q}%,address.ilike.%{q}%"
-        base = supabase.table("pois").select("*", count="exact").or_(filt)
+        # Full-text search on the GIN-indexed search_tsv column
+        # (name/descriptions/address, see supabase/migrations)
+        base = (
+            supabase.table("pois")
+            .select("*", count="exact")
+            .filter("search_tsv", "wfts(simple)", q)
+        )
 
         base = apply_common_ordering(base)
         start = offset
@@ -115,13 +152,15 @@ def search_pois(
         data = resp.data or []
         total = resp.count or 0
 
-        pois = [transform_poi_to_frontend(p) for p in data]
-        return {
-            "status": "success",
-            "query": q,
-            "count": total,
-            "data": pois,
-        }
+        pois = transform_pois_to_frontend(data)
+        return ORJSONResponse(
+            {
+                "status": "success",
+                "query": q,
+                "count": total,
+                "data": pois,
+            }
+        )
     except Exception as e:
         logger.exception("Error searching POIs")
         raise HTTPException(status_code=500, detail=str(e))
@@ -24,5 +24,12 @@ class Settings(BaseSettings):
     DEFAULT_LIMIT: int = 12
     MAX_LIMIT: int = 90
 
+    POI_CACHE_SIZE: int = 4096
+    POI_CACHE_TTL: int = 300  # seconds
+
+    # Pipeline worker processes; each keeps its own candidate/OSRM caches and
+    # OSRM circuit breaker, so a small pool keeps them warm
+    PIPELINE_WORKERS: int = 2
+
 
 settings = Settings()
@@ -1,16 +1,26 @@
-from supabase import create_client, Client
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
 from app.core.config import settings
 from app.utils.logger import get_logger
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 logger = get_logger(__name__)
 
-supabase: Client = None
+# Created on first get_supabase() call, so importing the app does not pay
+# for the supabase import or client construction
+supabase: Client | None = None
 
 
 def init_supabase():
     global supabase
     if settings.SUPABASE_URL and settings.SUPABASE_KEY:
         try:
+            from supabase import create_client
+
             supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
             logger.info("Supabase client initialized successfully")
             return supabase
@@ -22,11 +32,9 @@ def init_supabase():
         return None
 
 
-# Initialize Supabase client
-supabase = init_supabase()
-
-
 def get_supabase() -> Client:
+    if supabase is None:
+        init_supabase()
     if supabase is None:
         raise Exception("Supabase not connected")
     return supabase
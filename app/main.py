@@ -1,10 +1,24 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from app.api import pois
 from app.api import itinerary
 from app.core.config import settings
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI(title="Fika API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    itinerary.shutdown_pipeline_pool()
+
+
+app = FastAPI(
+    title="Fika API",
+    version="0.1.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 import numpy as np
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from typing import Protocol, Callable
 import numba
 
@@ -25,46 +26,95 @@ class DistanceMatrix(Protocol):
     def __call__(self, i: int, j: int) -> float: ...
 
 
-@numba.njit(cache=True, fastmath=True)
-def _calculate_probabilities(
-    pheromones: np.ndarray,
-    heuristic: np.ndarray,
-    visited: np.ndarray,
-    current: int,
-    alpha: float,
-    beta: float,
-) -> np.ndarray:
-    """Numba-optimized probability calculation."""
-    n = len(pheromones)
-    probs = np.zeros(n, dtype=np.float64)
-
-    for j in range(n):
-        if not visited[j]:
-            probs[j] = (pheromones[current, j] ** alpha) * (
-                heuristic[current, j] ** beta
-            )
+# PCG32 (XSH-RR) constants; each ant owns one uint64 state word
+_PCG_MULT = np.uint64(6364136223846793005)
+_PCG_INC = np.uint64(1442695040888963407)
+
+
+@numba.njit(cache=True, inline="always")
+def _pcg_seed(seed: int) -> np.uint64:
+    """Initial PCG32 state for a seed (pcg32_srandom with the default stream)."""
+    state = np.uint64(0) * _PCG_MULT + _PCG_INC
+    state += np.uint64(seed)
+    return state * _PCG_MULT + _PCG_INC
+
+
+@numba.njit(cache=True, inline="always")
+def _pcg_next(state: np.uint64) -> tuple[np.uint64, float]:
+    """Advance a PCG32 state; returns (new_state, uniform float in [0, 1))."""
+    # Explicit casts throughout: numba widens mixed/32-bit integer ops
+    state = np.uint64(state)
+    new_state = state * _PCG_MULT + _PCG_INC
+    xorshifted = np.uint32(((state >> np.uint64(18)) ^ state) >> np.uint64(27))
+    rot = np.uint32(state >> np.uint64(59))
+    out = np.uint32(
+        (xorshifted >> rot) | (xorshifted << ((np.uint32(32) - rot) & np.uint32(31)))
+    )
+    return new_state, out * 2.3283064365386963e-10  # 2**-32
 
-    total = np.sum(probs)
-    if total > 0:
-        probs /= total
 
-    return probs
+@numba.njit(cache=True, fastmath=True, boundscheck=False)
+def _calculate_probabilities(
+    weights_row: np.ndarray,
+    visited: np.ndarray,
+    probs: np.ndarray,
+) -> float:
+    """
+    Fill probs with the current city's row masked by visited; return the total.
+
+    probs is left unnormalized: _roulette_select scales the draw instead.
+    """
+    total = 0.0
+
+    # Single fused masked copy over a contiguous row (pow work done per iteration)
+    for j in range(len(weights_row)):
+        p = 0.0 if visited[j] else weights_row[j]
+        probs[j] = p
+        total += p
+
+    return total
+
+
+@numba.njit(cache=True, fastmath=True, boundscheck=False)
+def _roulette_select(probs: np.ndarray, total: float, r: float) -> int:
+    """
+    Roulette wheel pick for uniform r over unnormalized weights, or -1 if
+    all are zero.
+
+    A running sum against r * total replaces normalize + cumsum + searchsorted:
+    one pass, no temporaries.
+    """
+    target = r * total
+    acc = 0.0
+    last = -1
+    for j in range(len(probs)):
+        p = probs[j]
+        if p > 0.0:
+            acc += p
+            last = j
+            if acc > target:
+                return j
+    # Rounding can leave acc just short of target
+    return last
 
 
 @numba.njit(cache=True, fastmath=True)
 def _construct_solution(
-    pheromones: np.ndarray,
+    weights: np.ndarray,
     heuristic: np.ndarray,
     start: int,
-    alpha: float,
-    beta: float,
     seed: int,
 ) -> tuple[np.ndarray, float]:
-    """Numba-optimized ant solution construction."""
-    np.random.seed(seed)
-    n = len(pheromones)
+    """
+    Numba-optimized ant solution construction.
+
+    weights is pheromone**alpha * heuristic**beta, precomputed per iteration.
+    """
+    rng_state = _pcg_seed(seed)
+    n = len(weights)
     visited = np.zeros(n, dtype=np.bool_)
     path = np.zeros(n, dtype=np.int32)
+    probs = np.empty(n, dtype=np.float64)
 
     current = start
     path[0] = current
@@ -72,14 +122,69 @@ def _construct_solution(
     total_distance = 0.0
 
     for step in range(1, n):
-        probs = _calculate_probabilities(
-            pheromones, heuristic, visited, current, alpha, beta
+        total = _calculate_probabilities(weights[current], visited, probs)
+        rng_state, r = _pcg_next(rng_state)
+        next_city = _roulette_select(probs, total, r)
+        if next_city < 0:
+            # Only zero-weight cities left: take the first unvisited one
+            next_city = np.argmin(visited)
+
+        path[step] = next_city
+        total_distance += (
+            1.0 / heuristic[current, next_city]
+            if heuristic[current, next_city] > 0
+            else 1e10
         )
+        visited[next_city] = True
+        current = next_city
+
+    # Return to start
+    total_distance += (
+        1.0 / heuristic[current, start] if heuristic[current, start] > 0 else 1e10
+    )
+
+    return path, total_distance
+
+
+@numba.njit(cache=True, fastmath=True, boundscheck=False)
+def _construct_solution_small(
+    weights: np.ndarray,
+    heuristic: np.ndarray,
+    start: int,
+    seed: int,
+) -> tuple[np.ndarray, float]:
+    """
+    _construct_solution for n <= 64, tracking visited cities in one uint64.
+
+    Same draws and tour as the general kernel; the mask lives in a register
+    instead of a bool array.
+    """
+    rng_state = _pcg_seed(seed)
+    n = len(weights)
+    path = np.zeros(n, dtype=np.int32)
+    probs = np.empty(n, dtype=np.float64)
+
+    one = np.uint64(1)
+    current = start
+    path[0] = current
+    visited_mask = one << np.uint64(current)
+    total_distance = 0.0
 
-        # Roulette wheel selection
-        cumsum = np.cumsum(probs)
-        r = np.random.random()
-        next_city = np.searchsorted(cumsum, r)
+    for step in range(1, n):
+        weights_row = weights[current]
+        total = 0.0
+        for j in range(n):
+            p = 0.0 if (visited_mask >> np.uint64(j)) & one else weights_row[j]
+            probs[j] = p
+            total += p
+
+        rng_state, r = _pcg_next(rng_state)
+        next_city = _roulette_select(probs, total, r)
+        if next_city < 0:
+            # Only zero-weight cities left: take the lowest unvisited bit
+            next_city = 0
+            while (visited_mask >> np.uint64(next_city)) & one:
+                next_city += 1
 
         path[step] = next_city
         total_distance += (
@@ -87,7 +192,7 @@ def _construct_solution(
             if heuristic[current, next_city] > 0
             else 1e10
         )
-        visited[next_city] = True
+        visited_mask |= one << np.uint64(next_city)
         current = next_city
 
     # Return to start
@@ -98,6 +203,64 @@ def _construct_solution(
     return path, total_distance
 
 
+@numba.njit(cache=True, fastmath=True, nogil=True)
+def _construct_ant(
+    weights: np.ndarray,
+    heuristic: np.ndarray,
+    start: int,
+    seed: int,
+) -> tuple[np.ndarray, float]:
+    """Build one ant's tour, using the bitmask kernel when it fits in a uint64."""
+    if len(weights) <= 64:
+        return _construct_solution_small(weights, heuristic, start, seed)
+    return _construct_solution(weights, heuristic, start, seed)
+
+
+@numba.njit(cache=True, fastmath=True, parallel=True, nogil=True)
+def _construct_all_solutions(
+    weights: np.ndarray,
+    heuristic: np.ndarray,
+    starts: np.ndarray,
+    base_seed: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Construct one solution per ant in parallel (shared read-only matrices)."""
+    n_ants = len(starts)
+    n = len(weights)
+    paths = np.empty((n_ants, n), dtype=np.int32)
+    distances = np.empty(n_ants, dtype=np.float64)
+
+    for a in numba.prange(n_ants):
+        # Independent, reproducible stream per ant regardless of thread
+        seed = (base_seed ^ (a * 2654435761)) & 0x7FFFFFFF
+        path, distance = _construct_ant(weights, heuristic, starts[a], seed)
+        paths[a] = path
+        distances[a] = distance
+
+    return paths, distances
+
+
+@numba.njit(cache=True, fastmath=True, nogil=True)
+def _construct_all_solutions_serial(
+    weights: np.ndarray,
+    heuristic: np.ndarray,
+    starts: np.ndarray,
+    base_seed: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """_construct_all_solutions on the calling thread (one IAC colony per thread)."""
+    n_ants = len(starts)
+    n = len(weights)
+    paths = np.empty((n_ants, n), dtype=np.int32)
+    distances = np.empty(n_ants, dtype=np.float64)
+
+    for a in range(n_ants):
+        seed = (base_seed ^ (a * 2654435761)) & 0x7FFFFFFF
+        path, distance = _construct_ant(weights, heuristic, starts[a], seed)
+        paths[a] = path
+        distances[a] = distance
+
+    return paths, distances
+
+
 class AntColonyOptimizer:
     """High-performance ACO for TSP with modern Python practices."""
 
@@ -107,88 +270,110 @@ class AntColonyOptimizer:
         "n_cities",
         "pheromones",
         "heuristic",
+        "heuristic_weight",
         "best_path",
         "best_distance",
         "history",
+        "rng",
+        "_construct_kernel",
     )
 
-    def __init__(self, distance_matrix: np.ndarray, config: ACOConfig | None = None):
+    def __init__(
+        self,
+        distance_matrix: np.ndarray,
+        config: ACOConfig | None = None,
+        rng: np.random.RandomState | None = None,
+    ):
         self.config = config or ACOConfig()
+        # Defaults to numpy's global stream so np.random.seed() keeps working
+        self.rng = rng if rng is not None else np.random
+        self._construct_kernel = _construct_all_solutions
         self.distance_matrix = distance_matrix
         self.n_cities = len(distance_matrix)
 
-        # Initialize pheromones and heuristic
-        self.pheromones = np.ones((self.n_cities, self.n_cities), dtype=np.float64)
+        # Initialize pheromones and heuristic. Pheromones and the sampling
+        # weights are float32: the construction kernel is bandwidth-bound and
+        # roulette selection does not need double precision. The heuristic
+        # stays float64 since tour lengths are read back from it.
+        self.pheromones = np.ones((self.n_cities, self.n_cities), dtype=np.float32)
 
         # Heuristic: inverse of distance (avoid division by zero)
         with np.errstate(divide="ignore", invalid="ignore"):
             self.heuristic = np.where(distance_matrix > 0, 1.0 / distance_matrix, 0.0)
 
+        # heuristic**beta never changes across iterations
+        self.heuristic_weight = np.power(self.heuristic, self.config.beta).astype(
+            np.float32
+        )
+
         self.best_path: np.ndarray | None = None
         self.best_distance = np.inf
         self.history: list[float] = []
 
-    def _construct_solutions(self) -> list[tuple[np.ndarray, float]]:
-        """Construct solutions for all ants."""
-        solutions = []
-
-        for ant in range(self.config.n_ants):
-            start = np.random.randint(0, self.n_cities)
-            seed = np.random.randint(0, 2**31)
-
-            path, distance = _construct_solution(
-                self.pheromones,
-                self.heuristic,
-                start,
-                self.config.alpha,
-                self.config.beta,
-                seed,
-            )
-            solutions.append((path, distance))
+    def _construct_solutions(self) -> tuple[np.ndarray, np.ndarray]:
+        """Construct solutions for all ants: (paths[n_ants, n], distances[n_ants])."""
+        starts = self.rng.randint(0, self.n_cities, size=self.config.n_ants)
+        base_seed = self.rng.randint(0, 2**31)
+
+        # Attractiveness of every edge, computed once for all ants and steps
+        weights = np.power(self.pheromones, np.float32(self.config.alpha))
+        weights *= self.heuristic_weight
 
-        return solutions
+        return self._construct_kernel(weights, self.heuristic, starts, base_seed)
 
-    def _update_pheromones(self, solutions: list[tuple[np.ndarray, float]]) -> None:
+    def _update_pheromones(self, paths: np.ndarray, distances: np.ndarray) -> None:
         """Update pheromone trails using elitist strategy."""
         # Evaporation
         self.pheromones *= 1 - self.config.evaporation_rate
 
-        # Sort solutions by distance (best first)
-        solutions.sort(key=lambda x: x[1])
-
-        # Deposit pheromones from elite ants
-        for path, distance in solutions[: self.config.n_best]:
-            deposit = self.config.q / distance
-
-            for i in range(len(path) - 1):
-                self.pheromones[path[i], path[i + 1]] += deposit
-                self.pheromones[path[i + 1], path[i]] += deposit
-
-            # Close the loop
-            self.pheromones[path[-1], path[0]] += deposit
-            self.pheromones[path[0], path[-1]] += deposit
+        # Deposit pheromones from elite ants (the n_best shortest tours; their
+        # order does not matter, so a partial selection is enough) plus the
+        # global-best boost. All edges, both directions, are summed with one
+        # bincount over flat indices and added in a single pass, which is
+        # several times faster than np.add.at scatters.
+        n = self.n_cities
+        q = self.config.q
+        edge_parts: list[np.ndarray] = []
+        deposit_parts: list[np.ndarray] = []
+
+        n_best = min(self.config.n_best, len(distances))
+        if n_best > 0:
+            elite = np.argpartition(distances, n_best - 1)[:n_best]
+            src = paths[elite].ravel()
+            dst = np.roll(paths[elite], -1, axis=1).ravel()  # wraps to close loop
+            deposit = np.repeat(q / distances[elite], paths.shape[1])
+            edge_parts += [src * n + dst, dst * n + src]
+            deposit_parts += [deposit, deposit]
 
         # Additional boost for global best
         if self.best_path is not None:
-            deposit = self.config.q / self.best_distance
-            for i in range(len(self.best_path) - 1):
-                self.pheromones[self.best_path[i], self.best_path[i + 1]] += deposit * 2
-                self.pheromones[self.best_path[i + 1], self.best_path[i]] += deposit * 2
+            src, dst = self.best_path[:-1], self.best_path[1:]
+            deposit = np.full(len(src), 2 * q / self.best_distance)
+            edge_parts += [src * n + dst, dst * n + src]
+            deposit_parts += [deposit, deposit]
+
+        if edge_parts:
+            added = np.bincount(
+                np.concatenate(edge_parts),
+                np.concatenate(deposit_parts),
+                minlength=n * n,
+            )
+            self.pheromones += added.reshape(n, n).astype(np.float32)
 
     def optimize(
         self, callback: Callable[[int, float], None] | None = None
     ) -> tuple[np.ndarray, float]:
         """Run ACO optimization."""
         for iteration in range(self.config.n_iterations):
-            solutions = self._construct_solutions()
+            paths, distances = self._construct_solutions()
 
             # Update best solution
-            for path, distance in solutions:
-                if distance < self.best_distance:
-                    self.best_distance = distance
-                    self.best_path = path.copy()
+            best = int(np.argmin(distances))
+            if distances[best] < self.best_distance:
+                self.best_distance = float(distances[best])
+                self.best_path = paths[best].copy()
 
-            self._update_pheromones(solutions)
+            self._update_pheromones(paths, distances)
             self.history.append(self.best_distance)
 
             if callback:
@@ -196,16 +381,59 @@ class AntColonyOptimizer:
 
         return self.best_path, self.best_distance
 
+    def optimize_iac(self, n_colonies: int = 4) -> tuple[np.ndarray, float]:
+        """
+        Run independent ant colonies (IAC) concurrently and keep the best tour.
+
+        The iteration budget is split across n_colonies, each with its own
+        pheromone matrix and seed. Colonies run on threads with the serial
+        construction kernel, which releases the GIL, so parallelism comes from
+        the colonies rather than from ants within one colony.
+        """
+        n_colonies = max(1, n_colonies)
+        colony_config = replace(
+            self.config, n_iterations=max(1, self.config.n_iterations // n_colonies)
+        )
+        seeds = self.rng.randint(0, 2**31, size=n_colonies)
 
-def create_distance_matrix(coordinates: np.ndarray) -> np.ndarray:
-    """Create Euclidean distance matrix from coordinates."""
-    n = len(coordinates)
-    distances = np.zeros((n, n), dtype=np.float64)
+        colonies = []
+        for seed in seeds:
+            colony = AntColonyOptimizer(
+                self.distance_matrix, colony_config, np.random.RandomState(seed)
+            )
+            colony._construct_kernel = _construct_all_solutions_serial
+            colonies.append(colony)
+
+        with ThreadPoolExecutor(max_workers=n_colonies) as pool:
+            list(pool.map(AntColonyOptimizer.optimize, colonies))
+
+        best = min(colonies, key=lambda colony: colony.best_distance)
+        if best.best_distance < self.best_distance:
+            self.best_distance = best.best_distance
+            self.best_path = best.best_path
+            self.pheromones = best.pheromones
+        self.history.extend(best.history)
+
+        return self.best_path, self.best_distance
 
-    for i in range(n):
-        for j in range(i + 1, n):
-            dist = np.linalg.norm(coordinates[i] - coordinates[j])
-            distances[i, j] = dist
-            distances[j, i] = dist
+
+def create_distance_matrix(coordinates: np.ndarray, block_size: int = 64) -> np.ndarray:
+    """
+    Create Euclidean distance matrix from coordinates.
+
+    Rows are computed in blocks of block_size so the pairwise-difference
+    temporary stays cache-sized for large inputs.
+    """
+    coordinates = np.asarray(coordinates, dtype=np.float64)
+    n = len(coordinates)
+    distances = np.empty((n, n), dtype=np.float64)
+
+    # Pairwise differences rather than the |a|^2 + |b|^2 - 2ab Gram form,
+    # which cancels catastrophically for nearby points
+    for i0 in range(0, n, block_size):
+        diff = coordinates[i0 : i0 + block_size, None, :] - coordinates[None, :, :]
+        np.sqrt(
+            np.einsum("ijk,ijk->ij", diff, diff), out=distances[i0 : i0 + block_size]
+        )
 
     return distances
@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+import os
+import re
+import functools
+import hashlib
+import tempfile
+import threading
+import time
 import datetime as dt
-from dataclasses import dataclass
+import numpy as np
+from cachetools import TTLCache
+from dataclasses import dataclass, field
+from pathlib import Path
 from typing import List, Dict, Tuple, Optional
-from ortools.constraint_solver import pywrapcp, routing_enums_pb2
 from app.services.osrm import osrm_client
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 # Configuration
 
@@ -33,21 +45,50 @@ DINNER_WIN = (18 * 60, 21 * 60)  # 18:00-21:00
 
 PENALTY_MEAL_TO_MEAL = 40
 PENALTY_SAME_THEME = 15
+SOLVER_STALL_SEC = 2.0  # end the search after this long without a better solution
+SMALL_PROBLEM_STOPS_PER_DAY = 3  # at most this many POIs per day is a small problem
+SMALL_PROBLEM_STALL_SEC = 0.5  # small problems settle within ~150 ms
+SAVINGS_MAX_NODES = 25  # SAVINGS first solution up to this many nodes, else PCA
 DROP_PENALTY_BASE = 2000  # Base penalty for dropping a POI (include a POI unless including it is more expensive than 2000 cost units.)
 
+# Google-style range label, e.g. "10 am-9:30 pm" or "2-5:30 pm" (lowercased)
+TIME_RANGE_RE = re.compile(
+    r"\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*-\s*(\d{1,2})(?::(\d{2}))?\s*(am|pm)?\s*"
+)
+
+# Node roles as small ints for the solver-side arrays (see NodeArrays)
+ROLE_IDS = {"depot": 0, "attraction": 1, "meal": 2, "accommodation": 3}
+MEAL_ID = ROLE_IDS["meal"]
+
+# Travel matrices cached per POI set (repeat requests reuse the same POIs).
+# Only OSRM road times are cached; the Haversine fallback is recomputed.
+MATRIX_CACHE_DIR = Path(__file__).resolve().parents[2] / "storage" / "matrices"
+MATRIX_CACHE_TTL_SEC = 7 * 24 * 3600  # road times drift as OSRM data is updated
+MATRIX_CACHE_MAX_FILES = 512  # oldest .npy files are pruned beyond this
+
+# Recent matrices kept in memory as digest -> ({poi_id: row}, coords, matrix),
+# in sorted-ID order; a hit skips the .npy read, and a cached superset of the
+# requested POIs at the same coordinates is sliced instead of asking OSRM again
+_matrix_memo: TTLCache = TTLCache(maxsize=32, ttl=MATRIX_CACHE_TTL_SEC)
+_matrix_memo_lock = threading.Lock()
+
 # Data Structures
 
 
-@dataclass
+@dataclass(slots=True)
 class DaySpec:
     day_index: int
     date: dt.date
     start_min: int
     end_min: int
     depot_id: str
+    weekday: str = field(init=False)  # e.g. "Monday", resolved once
 
+    def __post_init__(self) -> None:
+        self.weekday = weekday_name(self.date)
 
-@dataclass
+
+@dataclass(slots=True)
 class Node:
     idx: int
     poi_id: str
@@ -61,20 +102,64 @@ class Node:
     is_mandatory: bool = False
 
 
+@dataclass
+class NodeArrays:
+    """Solver-time node attributes as parallel arrays indexed by node idx."""
+
+    role_id: np.ndarray  # int8 [N], see ROLE_IDS
+    service: np.ndarray  # int16 [N], minutes
+    theme_id: np.ndarray  # int16 [N], first theme code, -1 if none
+    available: np.ndarray  # bool [V, N], node has a window on day v
+    window_start: np.ndarray  # int16 [V, N], first window of the day
+    window_end: np.ndarray  # int16 [V, N]
+    is_mandatory: np.ndarray  # bool [N]
+
+
 # Helper Functions
 
 
+def _clock_minutes(h: int, m: int, ampm: Optional[str]) -> int:
+    """12-hour clock to minutes; a missing am/pm counts as pm."""
+    if ampm == "am":
+        if h == 12:
+            h = 0
+    elif h != 12:
+        h += 12
+    return h * 60 + m
+
+
+@functools.lru_cache(maxsize=4096)
 def parse_time_range_label(label: str) -> Optional[Tuple[int, int]]:
-    """Parse time range like '10 am-9 pm' to (600, 1260)."""
-    s = label.strip()
-    if "closed" in s.lower() or "open 24 hours" in s.lower():
-        return None if "closed" in s.lower() else (0, 24 * 60)
+    """
+    Parse time range like '10 am-9 pm' to (600, 1260).
+
+    Memoized: the same few hundred labels recur across POIs and days.
+    """
+    s = label.strip().lower()
+    if "closed" in s:
+        return None
+    if "open 24 hours" in s:
+        return (0, 24 * 60)
+
+    match = TIME_RANGE_RE.fullmatch(s)
+    if match is None:
+        return _parse_time_range_label_slow(s)
+
+    h1, m1, ap1, h2, m2, ap2 = match.groups()
+    a = _clock_minutes(int(h1), int(m1 or 0), ap1)
+    b = _clock_minutes(int(h2), int(m2 or 0), ap2)
+    if b <= a:
+        b = 24 * 60
+    return (a, b)
 
+
+def _parse_time_range_label_slow(s: str) -> Optional[Tuple[int, int]]:
+    """Lenient fallback for labels TIME_RANGE_RE does not match."""
     try:
         left, right = [x.strip() for x in s.split("-")]
 
         def to_min(x: str) -> int:
-            x = x.lower().replace(" ", "")
+            x = x.replace(" ", "")
             ampm = "am" if "am" in x else "pm"
             hhmm = x.replace("am", "").replace("pm", "")
             if ":" in hhmm:
@@ -82,19 +167,13 @@ def parse_time_range_label(label: str) -> Optional[Tuple[int, int]]:
                 h, m = int(h), int(m)
             else:
                 h, m = int(hhmm), 0
-            if ampm == "am":
-                if h == 12:
-                    h = 0
-            else:
-                if h != 12:
-                    h += 12
-            return h * 60 + m
+            return _clock_minutes(h, m, ampm)
 
         a, b = to_min(left), to_min(right)
         if b <= a:
             b = 24 * 60
         return (a, b)
-    except:
+    except ValueError:  # wrong number of parts or non-numeric hours
         return None
 
 
@@ -109,46 +188,169 @@ def minutes(hhmm: str) -> int:
     return h * 60 + m
 
 
-def pick_theme(themes: List[str], selected_themes: List[str]) -> Optional[str]:
-    """Pick first matching theme from POI themes."""
-    cat_s = " ".join(themes or []).lower()
-    for t in selected_themes:
-        if t.replace("_", " ") in cat_s:
-            return t
+def _memo_matrix(
+    digest: str, sorted_ids: List[str], sorted_coords: np.ndarray
+) -> Optional[np.ndarray]:
+    """Exact or superset hit from the in-memory matrix cache, else None."""
+    with _matrix_memo_lock:
+        hit = _matrix_memo.get(digest)
+        if hit is not None:
+            return hit[2]
+        entries = list(_matrix_memo.values())
+
+    for index, coords, matrix in entries:
+        if len(index) >= len(sorted_ids) and all(i in index for i in sorted_ids):
+            rows = [index[i] for i in sorted_ids]
+            # A POI whose coordinates changed needs fresh travel times
+            if np.array_equal(coords[rows], sorted_coords):
+                return matrix[np.ix_(rows, rows)]
     return None
 
 
+def _load_cached_matrix(path: Path) -> Optional[np.ndarray]:
+    """Read a persisted matrix unless it is missing, unreadable or expired."""
+    try:
+        if time.time() - path.stat().st_mtime > MATRIX_CACHE_TTL_SEC:
+            path.unlink(missing_ok=True)
+            return None
+        return np.load(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _prune_matrix_cache() -> None:
+    """Drop expired .npy files, then the oldest beyond MATRIX_CACHE_MAX_FILES."""
+    now = time.time()
+    with os.scandir(MATRIX_CACHE_DIR) as it:
+        files = [
+            (e.stat().st_mtime, e.path)
+            for e in it
+            if e.name.endswith(".npy") and e.is_file()
+        ]
+    files.sort(reverse=True)
+    for rank, (mtime, file_path) in enumerate(files):
+        if rank >= MATRIX_CACHE_MAX_FILES or now - mtime > MATRIX_CACHE_TTL_SEC:
+            try:
+                os.unlink(file_path)
+            except FileNotFoundError:
+                pass  # pruned concurrently by another worker
+
+
+def _save_cached_matrix(path: Path, matrix: np.ndarray) -> None:
+    """Persist a matrix via a unique temp file and os.replace, then prune."""
+    MATRIX_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(
+        dir=MATRIX_CACHE_DIR, prefix=f"{path.stem}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, matrix)
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+    _prune_matrix_cache()
+
+
+def travel_matrix_for_pois(poi_ids: List[str], coords: np.ndarray) -> np.ndarray:
+    """
+    Travel-time matrix (minutes) between unique POIs, cached in memory and
+    on disk.
+
+    coords: float64 array [len(poi_ids), 2] of (lat, lon)
+
+    The cache key is a blake2b digest of the sorted POI IDs and their
+    coordinates (rounded to ~1 m), so the same POI set hits regardless of
+    order while a moved POI misses. Only matrices built from OSRM road times
+    are cached, and cached files expire after MATRIX_CACHE_TTL_SEC.
+    Rows/cols of the result follow poi_ids.
+    """
+    order = sorted(range(len(poi_ids)), key=poi_ids.__getitem__)
+    sorted_ids = [poi_ids[i] for i in order]
+    sorted_coords = np.round(np.asarray(coords, dtype=np.float64)[order], 5)
+    h = hashlib.blake2b("\n".join(sorted_ids).encode(), digest_size=16)
+    h.update(sorted_coords.tobytes())
+    digest = h.hexdigest()
+    path = MATRIX_CACHE_DIR / f"{digest}.npy"
+
+    sorted_matrix = _memo_matrix(digest, sorted_ids, sorted_coords)
+    if sorted_matrix is None:
+        sorted_matrix = _load_cached_matrix(path)
+        if sorted_matrix is None:
+            # Query each distinct location once (a POI listed under two roles,
+            # or POIs sharing an entrance) and expand back to one row per ID
+            unique_coords, inverse = np.unique(
+                coords[order], axis=0, return_inverse=True
+            )
+            inverse = inverse.ravel()
+            unique_matrix, from_osrm = osrm_client.matrix_minutes_with_source(
+                unique_coords
+            )
+            sorted_matrix = unique_matrix[np.ix_(inverse, inverse)]
+            if from_osrm:
+                try:
+                    _save_cached_matrix(path, sorted_matrix)
+                except OSError as e:
+                    logger.warning(f"Failed to cache travel matrix {digest}: {e}")
+        else:
+            from_osrm = True  # only OSRM matrices are ever persisted
+            logger.info(f"Travel matrix cache hit: {len(poi_ids)} POIs")
+
+        if from_osrm:
+            with _matrix_memo_lock:
+                _matrix_memo[digest] = (
+                    {poi_id: i for i, poi_id in enumerate(sorted_ids)},
+                    sorted_coords,
+                    sorted_matrix,
+                )
+
+    inv = np.argsort(order)
+    return sorted_matrix[np.ix_(inv, inv)]
+
+
 def day_span(pacing: str) -> Tuple[int, int]:
     """Return (start_min, end_min) for a day based on pacing."""
     horizon = PACE_DAY_BUDGET_MIN.get(pacing, PACE_DAY_BUDGET_MIN["balanced"])
     return (9 * 60, 9 * 60 + horizon)
 
 
-def extract_windows_for_date(
-    open_hours: Optional[Dict[str, List[str]]],
-    date: dt.date,
+# openHours parsed once per POI: {weekday: (explicitly closed, ranges)}
+ParsedHours = Dict[str, Tuple[bool, List[Tuple[int, int]]]]
+
+
+def parse_open_hours(open_hours: Optional[Dict[str, List[str]]]) -> ParsedHours:
+    """Parse every weekday's openHours labels once, keyed by weekday name."""
+    parsed: ParsedHours = {}
+    for wn, raw in (open_hours or {}).items():
+        if not raw:
+            continue
+        closed_explicit = False
+        ranges: List[Tuple[int, int]] = []
+        for lab in raw:
+            if "closed" in lab.lower():
+                closed_explicit = True
+                continue
+            rng = parse_time_range_label(lab)
+            if rng:
+                ranges.append(rng)
+        parsed[wn] = (closed_explicit, ranges)
+    return parsed
+
+
+def windows_for_weekday(
+    parsed_hours: ParsedHours,
+    weekday: str,
     default_window: Tuple[int, int],
 ) -> List[Tuple[int, int]]:
-    """Extract time windows for a specific date from openHours."""
-    d_start, d_end = default_window
-    if not open_hours:
-        return [default_window]
-
-    wn = weekday_name(date)
-    raw = open_hours.get(wn)
-    if not raw:
+    """Clip a POI's parsed hours for one weekday to default_window."""
+    hours = parsed_hours.get(weekday)
+    if hours is None:
         return [default_window]
 
+    closed_explicit, ranges = hours
+    d_start, d_end = default_window
     out: List[Tuple[int, int]] = []
-    closed_explicit = False
-    for lab in raw:
-        if "closed" in lab.lower():
-            closed_explicit = True
-            continue
-        rng = parse_time_range_label(lab)
-        if not rng:
-            continue
-        a, b = rng
+    for a, b in ranges:
         a1, b1 = max(a, d_start), min(b, d_end)
         if a1 <= b1:
             out.append((a1, b1))
@@ -167,9 +369,8 @@ def build_problem(
     maut_output: dict,
     hotel: Dict[str, float],
     pacing: str = "balanced",
-    selected_themes: Optional[List[str]] = None,
     mandatory: Optional[Dict[str, Dict]] = None,
-) -> Tuple[List[DaySpec], List[Node], List[List[int]]]:
+) -> Tuple[List[DaySpec], List[Node], np.ndarray]:
     """
     Convert MAUT output to CVRPTW problem.
 
@@ -177,11 +378,11 @@ def build_problem(
         maut_output: Output from run_pipeline() with places, meta, etc.
         hotel: {"id": str, "name": str, "lat": float, "lon": float}
         pacing: "relaxed" | "balanced" | "packed"
-        selected_themes: List of theme keys
         mandatory: {poi_id: {"day": int, "window": ["HH:MM", "HH:MM"]}}
 
     Returns:
-        (day_specs, nodes, travel_matrix)
+        (day_specs, nodes, travel_matrix) with travel_matrix an int32 [N, N]
+        array of minutes
     """
     # Extract dates and num_days
     meta = maut_output.get("meta", {})
@@ -237,7 +438,6 @@ def build_problem(
     idx += 1
 
     # POI nodes - use structured pois_by_role if available, else fall back to places
-    sel_themes = maut_output.get("meta", {}).get("selected_themes", [])
     pois_by_role = meta.get("pois_by_role", {})
 
     # If structured by role, use that; otherwise use flat places list
@@ -251,22 +451,8 @@ def build_problem(
                 continue
 
             for poi in role_pois:
-                # Create separate node for each day the POI is available
-                for day_idx in range(num_days):
-                    poi_copy = poi.copy()
-                    poi_copy["id"] = f"{poi['id']}_day{day_idx}"
-                    poi_copy["_day_specific"] = day_idx
-                    _add_poi_node(
-                        poi_copy,
-                        role,
-                        nodes,
-                        idx,
-                        day_specs,
-                        pacing,
-                        sel_themes,
-                        mandatory,
-                    )
-                    idx += 1
+                _add_poi_node(poi, role, nodes, idx, day_specs, pacing, mandatory)
+                idx = len(nodes)
     else:
         # Fallback to flat places list
         places = maut_output.get("places", [])
@@ -280,19 +466,12 @@ def build_problem(
             else:
                 role = "attraction"
 
-            # Create separate node for each day
-            for day_idx in range(num_days):
-                poi_copy = poi.copy()
-                poi_copy["id"] = f"{poi['id']}_day{day_idx}"
-                poi_copy["_day_specific"] = day_idx
-                _add_poi_node(
-                    poi_copy, role, nodes, idx, day_specs, pacing, sel_themes, mandatory
-                )
-                idx += 1
+            _add_poi_node(poi, role, nodes, idx, day_specs, pacing, mandatory)
+            idx = len(nodes)
 
     # Build travel matrix
-    coords = [(n.lat, n.lon) for n in nodes]
-    travel = osrm_client.matrix_minutes(coords)
+    node_coords = np.array([(n.lat, n.lon) for n in nodes], dtype=np.float64)
+    travel = travel_matrix_for_pois([n.poi_id for n in nodes], node_coords)
 
     return day_specs, nodes, travel
 
@@ -304,12 +483,15 @@ def _add_poi_node(
     idx: int,
     day_specs: List[DaySpec],
     pacing: str,
-    sel_themes: List[str],
     mandatory: Optional[Dict[str, Dict]],
 ) -> None:
-    """Helper to add a POI node to the nodes list."""
+    """
+    Helper to add a POI node to the nodes list.
+
+    One node per POI; windows_by_day lists the days it is open. The solver
+    restricts it to those days' vehicles.
+    """
     service = SERVICE_TIME[role][pacing]
-    theme = pick_theme(poi.get("themes", []), sel_themes)
 
     # Extract coordinates
     coords = poi.get("coordinates")
@@ -325,56 +507,43 @@ def _add_poi_node(
 
     # Build per-day windows
     wbd: Dict[int, List[Tuple[int, int]]] = {}
-
-    open_hours = poi.get("openHours")
-    day_specific = poi.get("_day_specific")
+    parsed_hours = parse_open_hours(poi.get("openHours"))
 
     # Role-based default window
     role_default = DEFAULT_ROLE_WINDOWS.get(role, (9 * 60, 21 * 60))
 
-    if day_specific is not None:
-        # Only available on specific day
-        d = day_specs[day_specific]
-
+    for d in day_specs:
         # Intersect day span with role default
         day_start = max(d.start_min, role_default[0])
         day_end = min(d.end_min, role_default[1])
         day_default = (day_start, day_end)
 
-        windows = extract_windows_for_date(open_hours, d.date, day_default)
-        # If closed or no valid windows, skip this POI for that day
-        if not windows:
-            return
-        wbd[day_specific] = windows
-    else:
-        # Available on all days - check each day
-        for d in day_specs:
-            day_start = max(d.start_min, role_default[0])
-            day_end = min(d.end_min, role_default[1])
-            day_default = (day_start, day_end)
-
-            windows = extract_windows_for_date(open_hours, d.date, day_default)
-            if windows:
-                wbd[d.day_index] = windows
+        windows = windows_for_weekday(parsed_hours, d.weekday, day_default)
+        if windows:
+            wbd[d.day_index] = windows
 
-        # If POI is closed on all days, don't add it
-        if not wbd:
-            return
+    # If POI is closed on all days, don't add it
+    if not wbd:
+        return
 
-    # Mandatory override: use base POI ID and match day
-    base_id = poi["id"].rsplit("_day", 1)[0]
+    # Mandatory override: pin the POI to its day and window
     is_mand = False
 
-    if mandatory and base_id in mandatory:
-        md_spec = mandatory[base_id]
+    if mandatory and poi["id"] in mandatory:
+        md_spec = mandatory[poi["id"]]
         dk = int(md_spec["day"]) - 1  # 1-based in API, 0-based internally
-
-        # If this node is day-specific, enforce only on that day
-        if day_specific is None or day_specific == dk:
-            a = minutes(md_spec["window"][0])
-            b = minutes(md_spec["window"][1])
-            wbd = {dk: [(a, b)]}
-            is_mand = True
+        if not 0 <= dk < len(day_specs):
+            # No vehicle could visit it: adding it would leave an
+            # unconstrained node the solver may place on any day
+            logger.warning(
+                f"Mandatory POI {poi['id']} pinned to day {md_spec['day']} "
+                f"outside the {len(day_specs)}-day trip, skipping"
+            )
+            return
+        a = minutes(md_spec["window"][0])
+        b = minutes(md_spec["window"][1])
+        wbd = {dk: [(a, b)]}
+        is_mand = True
 
     nodes.append(
         Node(
@@ -395,10 +564,64 @@ def _add_poi_node(
 # OR-Tools Solver
 
 
+def build_node_arrays(nodes: List[Node], num_days: int) -> NodeArrays:
+    """Encode nodes once into NodeArrays (roles/themes as ints)."""
+    N = len(nodes)
+    theme_codes: Dict[str, int] = {}
+    role_id = np.empty(N, dtype=np.int8)
+    service = np.empty(N, dtype=np.int16)
+    theme_id = np.empty(N, dtype=np.int16)
+    is_mandatory = np.empty(N, dtype=np.bool_)
+    available = np.zeros((num_days, N), dtype=np.bool_)
+    window_start = np.full((num_days, N), -1, dtype=np.int16)
+    window_end = np.full((num_days, N), -1, dtype=np.int16)
+
+    for i, n in enumerate(nodes):
+        role_id[i] = ROLE_IDS[n.role]
+        service[i] = n.service
+        theme_id[i] = (
+            theme_codes.setdefault(n.themes[0], len(theme_codes)) if n.themes else -1
+        )
+        is_mandatory[i] = n.is_mandatory
+        for day, windows in n.windows_by_day.items():
+            if not 0 <= day < num_days:
+                continue
+            available[day, i] = True
+            if windows:
+                window_start[day, i], window_end[day, i] = windows[0]
+
+    return NodeArrays(
+        role_id=role_id,
+        service=service,
+        theme_id=theme_id,
+        available=available,
+        window_start=window_start,
+        window_end=window_end,
+        is_mandatory=is_mandatory,
+    )
+
+
+def transit_cost_matrix(arrays: NodeArrays, travel: np.ndarray) -> np.ndarray:
+    """
+    Arc cost i -> j: travel time plus service at i, with penalties for
+    back-to-back meals and consecutive POIs sharing their first theme.
+    """
+    service = arrays.service.astype(np.int64)
+    is_meal = arrays.role_id == MEAL_ID
+    theme = arrays.theme_id
+
+    cost = np.asarray(travel, dtype=np.int64) + service[:, None]
+    cost += PENALTY_MEAL_TO_MEAL * (is_meal[:, None] & is_meal[None, :])
+    cost += PENALTY_SAME_THEME * (
+        (theme[:, None] == theme[None, :]) & (theme[:, None] >= 0)
+    )
+    return cost
+
+
 def solve_cvrptw(
     day_specs: List[DaySpec],
     nodes: List[Node],
-    travel: List[List[int]],
+    travel: np.ndarray,
     meals_required: int = 2,
     time_limit_sec: int = 15,
 ) -> dict:
@@ -408,7 +631,7 @@ def solve_cvrptw(
     Args:
         day_specs: List of day specifications
         nodes: List of nodes (depot + POIs)
-        travel: Travel time matrix
+        travel: Travel time matrix in minutes, [N, N] (array or nested lists)
         meals_required: Minimum meals per day
         time_limit_sec: Solver time limit
 
@@ -421,24 +644,21 @@ def solve_cvrptw(
     if len(nodes) <= 1:  # Only depot
         return {"days": [], "note": "No POIs available"}
 
+    # Imported here: the ortools extension is only needed once a route is solved
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
     N = len(nodes)
     V = len(day_specs)
 
+    arrays = build_node_arrays(nodes, V)
+    is_meal = arrays.role_id == MEAL_ID
+
     manager = pywrapcp.RoutingIndexManager(N, V, 0)
     routing = pywrapcp.RoutingModel(manager)
 
-    # Transit callback
-    def transit_cb(from_index, to_index):
-        i, j = manager.IndexToNode(from_index), manager.IndexToNode(to_index)
-        base = travel[i][j] + nodes[i].service
-        bonus = 0
-        if nodes[i].role == "meal" and nodes[j].role == "meal":
-            bonus += PENALTY_MEAL_TO_MEAL
-        if nodes[i].themes and nodes[j].themes and nodes[i].themes[0] == nodes[j].themes[0]:
-            bonus += PENALTY_SAME_THEME
-        return base + bonus
-
-    t_idx = routing.RegisterTransitCallback(transit_cb)
+    # Transit costs as a matrix: OR-Tools evaluates arcs in C++ without
+    # calling back into Python
+    t_idx = routing.RegisterTransitMatrix(transit_cost_matrix(arrays, travel).tolist())
     routing.SetArcCostEvaluatorOfAllVehicles(t_idx)
 
     # Time dimension
@@ -450,69 +670,73 @@ def solve_cvrptw(
         time_dim.CumulVar(routing.Start(v)).SetRange(d.start_min, d.end_min)
         time_dim.CumulVar(routing.End(v)).SetRange(d.start_min, d.end_min)
 
-    # Node time windows and vehicle assignment
-    for ni, n in enumerate(nodes):
-        if n.role == "depot":
+    # Node time windows and vehicle assignment. Each POI is a single node:
+    # it may only ride on the vehicles (days) it is open, its cumul gets the
+    # hull of those days' windows, and days whose window is narrower than
+    # the hull add a constraint that only binds when that vehicle visits it.
+    solver = routing.solver()
+    for ni in np.flatnonzero(arrays.role_id != ROLE_IDS["depot"]).tolist():
+        index = manager.NodeToIndex(ni)
+        cumul = time_dim.CumulVar(index)
+        days = np.flatnonzero(arrays.available[:, ni]).tolist()
+        if not days:
+            # No window on any trip day (build_problem already skips these):
+            # keep it off every route rather than leave it unconstrained
+            solver.Add(routing.ActiveVar(index) == 0)
             continue
+        if len(days) < V:
+            routing.SetAllowedVehiclesForIndex(days, index)
 
-        # If POI is available on multiple days, allow any vehicle
-        # If POI is day-specific (like hotel accommodation), restrict to that day
-        available_days = list(n.windows_by_day.keys())
+        starts = arrays.window_start[days, ni].astype(np.int64)
+        ends = arrays.window_end[days, ni].astype(np.int64)
+        lo, hi = int(starts.min()), int(ends.max())
+        cumul.SetRange(lo, hi)
 
-        if len(available_days) == 1:
-            # Day-specific POI - restrict to that vehicle/day
-            day_v = available_days[0]
-            routing.SetAllowedVehiclesForIndex([day_v], manager.NodeToIndex(ni))
-            a_min, b_max = n.windows_by_day[day_v][0]
-            time_dim.CumulVar(manager.NodeToIndex(ni)).SetRange(a_min, b_max)
-        else:
-            # Multi-day POI - can be visited by any vehicle, set time windows per vehicle
-            for day_v in available_days:
-                if n.windows_by_day[day_v]:
-                    a_min, b_max = n.windows_by_day[day_v][0]
-                    # Set time window for this vehicle
-                    time_dim.CumulVar(manager.NodeToIndex(ni)).SetRange(a_min, b_max)
-
-    # Disjunctions (visit at most once) - group by base POI ID without _dayX suffix
+        for day_v, ws, we in zip(days, starts.tolist(), ends.tolist()):
+            if ws == lo and we == hi:
+                continue
+            on_day = solver.IsEqualCstVar(routing.VehicleVar(index), day_v)
+            solver.Add(cumul >= lo + (ws - lo) * on_day)
+            solver.Add(cumul <= hi - (hi - we) * on_day)
+
+    # Disjunctions (visit at most once), grouped by POI ID since a POI can be
+    # listed under more than one role
     by_poi: Dict[str, List[int]] = {}
     for i, n in enumerate(nodes):
         if n.role != "depot":
-            # Strip _dayX suffix to group all copies of same POI
-            base_id = n.poi_id.rsplit("_day", 1)[0]
-            by_poi.setdefault(base_id, []).append(i)
+            by_poi.setdefault(n.poi_id, []).append(i)
 
     for poi_id, idxs in by_poi.items():
-        any_mand = any(nodes[i].is_mandatory for i in idxs)
+        any_mand = arrays.is_mandatory[idxs].any()
         penalty = 10_000_000 if any_mand else DROP_PENALTY_BASE
         routing.AddDisjunction([manager.NodeToIndex(i) for i in idxs], penalty, 1)
 
     # Meals dimension with requirement - cap at 3 meals per day
-    def meal_cb(from_index, to_index):
-        j = manager.IndexToNode(to_index)
-        return 1 if nodes[j].role == "meal" else 0
-
-    meal_idx = routing.RegisterTransitCallback(meal_cb)
+    # (arc i -> j counts 1 when j is a meal)
+    meal_idx = routing.RegisterTransitMatrix(
+        np.broadcast_to(is_meal.astype(np.int64), (N, N)).tolist()
+    )
     routing.AddDimension(meal_idx, 0, 3, True, "Meals")  # Max 3 meals per day
     meal_dim = routing.GetDimensionOrDie("Meals")
 
     # Enforce meal requirements per day (min and max)
     if meals_required > 0:
+        meals_per_day = (is_meal & arrays.available).sum(axis=1)
         for v in range(V):
-            available_meals = sum(
-                1
-                for ni, n in enumerate(nodes)
-                if n.role == "meal"
-                and (len(n.windows_by_day) > 1 or v in n.windows_by_day)
-            )
+            available_meals = int(meals_per_day[v])
             req_min = min(meals_required, available_meals)
             req_max = min(3, available_meals)  # Cap at 3 meals
             if req_min > 0:
                 meal_dim.CumulVar(routing.End(v)).SetRange(req_min, req_max)
 
     # Search parameters
+    # Small problems start from SAVINGS, which lets GLS settle sooner; larger
+    # ones keep PATH_CHEAPEST_ARC. Simulated annealing was tried for small
+    # trips but dropped stops that GLS keeps
+    strategies = routing_enums_pb2.FirstSolutionStrategy
     params = pywrapcp.DefaultRoutingSearchParameters()
     params.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+        strategies.SAVINGS if N <= SAVINGS_MAX_NODES else strategies.PATH_CHEAPEST_ARC
     )
     params.local_search_metaheuristic = (
         routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
@@ -521,7 +745,47 @@ def solve_cvrptw(
     params.log_search = False
     routing.SetFixedCostOfAllVehicles(0)
 
+    # Stop once the best cost has not improved for SOLVER_STALL_SEC: small
+    # problems settle in well under a second but GLS would otherwise keep
+    # searching until time_limit_sec
+    stall_sec = (
+        SMALL_PROBLEM_STALL_SEC
+        if N - 1 <= SMALL_PROBLEM_STOPS_PER_DAY * V
+        else SOLVER_STALL_SEC
+    )
+    last_improvement = [time.monotonic(), None]  # (time, best cost)
+
+    def on_solution() -> None:
+        cost = routing.CostVar().Value()
+        if last_improvement[1] is None or cost < last_improvement[1]:
+            last_improvement[:] = [time.monotonic(), cost]
+
+    routing.AddAtSolutionCallback(on_solution)
+    routing.AddSearchMonitor(
+        routing.solver().CustomLimit(
+            lambda: (
+                last_improvement[1] is not None
+                and time.monotonic() - last_improvement[0] > stall_sec
+            )
+        )
+    )
+
+    solve_start = time.monotonic()
     solution = routing.SolveWithParameters(params)
+    remaining_sec = time_limit_sec - (time.monotonic() - solve_start)
+    if (
+        not solution
+        and params.first_solution_strategy == strategies.SAVINGS
+        and remaining_sec > 0
+    ):
+        # SAVINGS can fail to build any first solution when day-restricted
+        # POIs and the per-day meal minimum leave few feasible route merges;
+        # the cheapest-arc construction still finds one. The retry only gets
+        # what is left of time_limit_sec.
+        params.first_solution_strategy = strategies.PATH_CHEAPEST_ARC
+        params.time_limit.FromMilliseconds(int(remaining_sec * 1000))
+        last_improvement[:] = [time.monotonic(), None]
+        solution = routing.SolveWithParameters(params)
 
     # Build result
     result = {"days": []}
@@ -605,13 +869,8 @@ def run_cvrptw(
         {"days": [{"date": str, "stops": [...], "meals": int}]}
     """
     try:
-        selected_themes = maut_output.get("meta", {}).get("selected_themes", [])
         day_specs, nodes, travel = build_problem(
-            maut_output,
-            hotel,
-            pacing=pacing,
-            selected_themes=selected_themes,
-            mandatory=mandatory,
+            maut_output, hotel, pacing=pacing, mandatory=mandatory
         )
 
         # Debug: Check what we got
@@ -1,17 +1,14 @@
 from __future__ import annotations
 
-import os
+import threading
 import math
-from dotenv import load_dotenv
-from supabase import create_client
+import operator
+import numpy as np
+from cachetools import TTLCache
 from typing import Any, Dict, List, Optional, Set, TypedDict
+from app.db.supabase_client import get_supabase
 from app.schemas.itinerary import POI, Coordinates, ItineraryResponse
 
-# Supabase client
-
-load_dotenv()
-_sb = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_KEY"])
-
 # Config
 
 BUDGET_TARGET = {"tight": 1.0, "sensible": 2.0, "upscale": 3.0, "luxury": 4.0}
@@ -26,6 +23,18 @@ BASE_WEIGHTS = {
     "access": 0.1,
 }
 
+# Candidate rows per RPC signature; POI data changes rarely and many requests
+# share a destination, themes and flags. Pipelines run in worker processes
+# (see app/api/itinerary.py), so each worker has its own cache; the lock only
+# guards threads within one process.
+CANDIDATE_CACHE_SIZE = 512
+CANDIDATE_CACHE_TTL = 300  # seconds
+
+_candidate_cache: TTLCache = TTLCache(
+    maxsize=CANDIDATE_CACHE_SIZE, ttl=CANDIDATE_CACHE_TTL
+)
+_candidate_cache_lock = threading.Lock()
+
 
 # Internal DTO
 class Row(TypedDict, total=False):
@@ -58,6 +67,8 @@ class Row(TypedDict, total=False):
 
 # Helpers
 
+_by_score = operator.itemgetter("_score")  # sort key for scored rows
+
 
 def popularity_score(rating: Optional[float], reviews: Optional[int]) -> float:
     r = 0.0 if rating is None else max(0.0, min(1.0, float(rating) / 5.0))
@@ -166,8 +177,17 @@ def fetch_candidates(req: Dict[str, Any], selected_themes: List[str]) -> List[Ro
         "p_seed_lon": req.get("seed_lon"),
         "p_seed_lat": req.get("seed_lat"),
     }
-    rsp = _sb.rpc("rpc_fetch_poi_candidates_quota", params).execute()
-    return list(rsp.data or [])
+    key = tuple((k, tuple(v) if isinstance(v, list) else v) for k, v in params.items())
+    with _candidate_cache_lock:
+        data = _candidate_cache.get(key)
+    if data is None:
+        rsp = get_supabase().rpc("rpc_fetch_poi_candidates_quota", params).execute()
+        data = list(rsp.data or [])
+        with _candidate_cache_lock:
+            _candidate_cache[key] = data
+
+    # Copies: the pipeline writes scores into its rows
+    return [dict(r) for r in data]
 
 
 # Scoring
@@ -241,6 +261,102 @@ def score_row(req: Dict[str, Any], row: Row, selected_themes: List[str]) -> floa
     )
 
 
+def _flag_column(rows: List[Row], key: str) -> np.ndarray:
+    """Column of optional flags; None becomes False."""
+    return np.array([r.get(key) for r in rows], dtype=np.bool_)
+
+
+def _float_column(rows: List[Row], key: str) -> np.ndarray:
+    """Column of optional numbers; None becomes NaN."""
+    return np.array([r.get(key) for r in rows], dtype=np.float64)
+
+
+def score_rows(
+    req: Dict[str, Any], rows: List[Row], selected_themes: List[str]
+) -> np.ndarray:
+    """
+    score_row for every row at once: the per-row fields are read into
+    columns and each dimension is scored as an array op. Terms are summed
+    in score_row's order so the results are identical.
+    """
+    n = len(rows)
+    has_meal = np.zeros(n, dtype=np.bool_)
+    s_interest = np.zeros(n, dtype=np.float64)
+    # interest_match_score, with the selected theme set built once
+    selected = frozenset(selected_themes)
+    n_selected = len(selected_themes)
+    for i, r in enumerate(rows):
+        roles = r.get("poi_roles") or []
+        if "meal" in roles:
+            has_meal[i] = True
+        # Theme matching only for attractions, not for meals or accommodations
+        elif "attraction" in roles and "accommodation" not in roles:
+            themes = r.get("themes")
+            if themes and n_selected:
+                s_interest[i] = len(selected.intersection(themes)) / n_selected
+
+    # Weights depend on the row only through the dietary dimension (meals).
+    # W_meal holds every applicable dimension; the others are never computed
+    W = renorm_weights(applicable_dims(req, []))
+    W_meal = renorm_weights(applicable_dims(req, ["meal"]))
+    dim_scores: Dict[str, np.ndarray] = {"interest": s_interest}
+
+    if "cost" in W_meal:
+        price = _float_column(rows, "price_level")
+        target = BUDGET_TARGET.get(req.get("budget_tier"), 4.0)
+        dim_scores["cost"] = np.where(
+            np.isnan(price), 1.0, np.maximum(0.0, 1.0 - np.abs(price - target) / 3.0)
+        )
+
+    if "popularity" in W_meal:
+        rating = np.nan_to_num(_float_column(rows, "review_rating"), nan=0.0)
+        reviews = np.nan_to_num(_float_column(rows, "review_count"), nan=0.0)
+        r = np.clip(rating / 5.0, 0.0, 1.0)
+        rc = np.minimum(1.0, np.log10(1.0 + np.maximum(reviews, 0.0)) / 3.0)
+        dim_scores["popularity"] = np.where(reviews > 0, 0.7 * r + 0.3 * rc, 0.5 * r)
+
+    if "child" in W_meal:
+        dim_scores["child"] = _flag_column(rows, "kids_friendly").astype(np.float64)
+
+    if "dietary" in W_meal:
+        prefs = set(req.get("dietary_restrictions") or [])
+        if prefs:
+            vegan = _flag_column(rows, "vegan_options")
+            hit = np.zeros(n, dtype=np.bool_)
+            if "halal" in prefs:
+                hit |= _flag_column(rows, "halal_food")
+            if "vegan" in prefs:
+                hit |= vegan
+            if "vegetarian" in prefs:
+                hit |= _flag_column(rows, "vegetarian_options") | vegan
+            dim_scores["dietary"] = hit.astype(np.float64)
+        else:
+            dim_scores["dietary"] = np.full(n, 0.5)
+
+    if "pet" in W_meal:
+        dim_scores["pet"] = _flag_column(rows, "pets_friendly").astype(np.float64)
+
+    if "access" in W_meal:
+        # any_accessible inlined, one pass; most rows stop at the first flag
+        access = np.array(
+            [
+                r.get("wheelchair_accessible_entrance")
+                or r.get("wheelchair_accessible_seating")
+                or r.get("wheelchair_accessible_toilet")
+                for r in rows
+            ],
+            dtype=np.bool_,
+        )
+        dim_scores["access"] = access.astype(np.float64)
+
+    # Summed in score_row's dimension order
+    scores = np.zeros(n, dtype=np.float64)
+    for dim, s_dim in dim_scores.items():
+        w = np.where(has_meal, W_meal.get(dim, 0.0), W.get(dim, 0.0))
+        scores += w * s_dim
+    return scores
+
+
 def trim_by_role(
     scored: List[Row], num_days: int, selected_themes: List[str]
 ) -> Dict[str, List[Row]]:
@@ -260,34 +376,29 @@ def trim_by_role(
     # Group by role - POIs can appear in multiple role groups
     by_role: Dict[str, List[Row]] = {"attraction": [], "meal": [], "accommodation": []}
 
+    # One pass, each role test done once per row
     for r in scored:
-        roles = r.get("poi_roles") or []
+        roles = r.get("poi_roles") or ()
+        is_meal = "meal" in roles
 
         # Meals: any POI that has a meal role
-        if "meal" in roles:
+        if is_meal:
             by_role["meal"].append(r)
 
-        # Pure accommodation only: no attraction/meal role
-        if (
-            "accommodation" in roles
-            and "attraction" not in roles
-            and "meal" not in roles
-        ):
-            by_role["accommodation"].append(r)
-
         # Attractions: anything marked as attraction (even if also meal/accommodation)
         if "attraction" in roles:
             by_role["attraction"].append(r)
-
-        # If no explicit roles at all, treat as attraction
-        if not roles or (
-            not any(role in roles for role in ["meal", "accommodation", "attraction"])
-        ):
+        elif "accommodation" in roles:
+            # Pure accommodation only: no attraction/meal role
+            if not is_meal:
+                by_role["accommodation"].append(r)
+        elif not is_meal:
+            # If no known role at all, treat as attraction
             by_role["attraction"].append(r)
 
     # Sort each role by score
     for role in by_role:
-        by_role[role].sort(key=lambda x: x["_score"], reverse=True)
+        by_role[role].sort(key=_by_score, reverse=True)
 
     # Trim to quotas - process in priority order to avoid duplicates
     result: Dict[str, List[Row]] = {}
@@ -416,11 +527,10 @@ def run_pipeline(payload: Dict[str, Any], *, as_model: bool = False):
     # 2) Fetch POI candidates from Supabase RPC
     rows: List[Row] = fetch_candidates(payload, selected_themes)
 
-    # 3) Score each POI using MAUT algorithm
-    scored: List[Row] = []
-    for r in rows:
-        r["_score"] = score_row(payload, r, selected_themes)
-        scored.append(r)
+    # 3) Score all POIs using MAUT algorithm
+    scored: List[Row] = rows
+    for r, score in zip(rows, score_rows(payload, rows, selected_themes).tolist()):
+        r["_score"] = score
 
     # 4) Trim by role quotas - returns dict by role with theme balance
     trimmed_by_role = trim_by_role(scored, payload.get("num_days", 3), selected_themes)
@@ -429,23 +539,24 @@ def run_pipeline(payload: Dict[str, Any], *, as_model: bool = False):
     all_trimmed: List[Row] = []
     for role_pois in trimmed_by_role.values():
         all_trimmed.extend(role_pois)
-    all_trimmed.sort(key=lambda x: x["_score"], reverse=True)
-
-    # 6) Map internal Row format to API POI format
-    pois = [to_poi(r) for r in all_trimmed]
+    all_trimmed.sort(key=_by_score, reverse=True)
 
-    # 7) Also create role-separated POI lists for CVRPTW
+    # 6) Map internal Row format to API POI format, role-separated for CVRPTW;
+    #    each row is converted once and places reuses the same objects
     pois_by_role = {
         role: [to_poi(r) for r in rows_list]
         for role, rows_list in trimmed_by_role.items()
     }
+    poi_for_row = {
+        id(r): p
+        for role, rows_list in trimmed_by_role.items()
+        for r, p in zip(rows_list, pois_by_role[role])
+    }
+    pois = [poi_for_row[id(r)] for r in all_trimmed]
 
-    # 7.1) Select default hotel from accommodations (highest scored)
-    accom_rows = trimmed_by_role.get("accommodation", [])
-    selected_hotel_poi: Optional[POI] = None
-    if accom_rows:
-        best_hotel_row = accom_rows[0]
-        selected_hotel_poi = to_poi(best_hotel_row)
+    # 7) Select default hotel from accommodations (highest scored)
+    accom_pois = pois_by_role.get("accommodation", [])
+    selected_hotel_poi: Optional[POI] = accom_pois[0] if accom_pois else None
 
     # 8) Build response (CVRPTW/ACO will compute route_order, total_distance, total_time)
     resp = ItineraryResponse(
@@ -463,17 +574,12 @@ def run_pipeline(payload: Dict[str, Any], *, as_model: bool = False):
                 "meal": len(trimmed_by_role["meal"]),
                 "accommodation": len(trimmed_by_role["accommodation"]),
             },
-            "pois_by_role": {
-                role: [
-                    p.model_dump() if hasattr(p, "model_dump") else p for p in pois_list
-                ]
-                for role, pois_list in pois_by_role.items()
-            },
+            # POI models here are dumped with the rest of the response in
+            # one serializer pass
+            "pois_by_role": pois_by_role,
             "num_days": payload.get("num_days"),
             "dates": payload.get("dates"),
-            "selected_hotel": (
-                selected_hotel_poi.model_dump() if selected_hotel_poi else None
-            ),
+            "selected_hotel": selected_hotel_poi,
         },
     )
     return resp if as_model else resp.model_dump()
@@ -1,4 +1,11 @@
+import random
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+import numpy as np
+import orjson
+from cachetools import LRUCache
 from math import radians, sin, cos, sqrt, atan2
 from typing import Optional, List, Tuple
 from app.core.config import settings
@@ -7,6 +14,13 @@ from app.utils.logger import get_logger
 logger = get_logger(__name__)
 
 MAX_OSRM_NODES = 1600  # Max nodes for OSRM /table requests
+OSRM_MAX_ATTEMPTS = 2  # Tries per request on connection errors / 5xx
+OSRM_BACKOFF_BASE_SEC = 0.25  # Full-jitter backoff: sleep U(0, base * 2**k)
+OSRM_BACKOFF_CAP_SEC = 4.0
+OSRM_BREAKER_FAILURES = 5  # Consecutive failures before skipping OSRM
+OSRM_BREAKER_RECOVERY_SEC = 30.0  # How long to skip OSRM before trying again
+OSRM_PROBE_TTL_SEC = 60.0  # How long a health probe result is trusted
+ROUTE_CACHE_SIZE = 4096  # Memoized pairwise OSRM routes
 
 
 def haversine_distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
@@ -29,29 +43,98 @@ def haversine_time_seconds(
     return (distance_km / speed_kmh) * 3600.0
 
 
+def _pair_key(
+    lat1: float, lon1: float, lat2: float, lon2: float
+) -> Tuple[float, float, float, float]:
+    """Route cache key; 5 decimals is ~1 m, well inside OSRM's snapping."""
+    return (round(lat1, 5), round(lon1, 5), round(lat2, 5), round(lon2, 5))
+
+
+def haversine_km_matrix(coords) -> np.ndarray:
+    """
+    Pairwise great-circle distances in km as an (N, N) float64 array.
+    coords: [(lat, lon), ...] or an (N, 2) array
+    """
+    lat, lon = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2)).T
+
+    # Per-point half-angle terms, computed once; the pairwise
+    # sin((x_i - x_j) / 2) follows from the angle-difference identity
+    sin_lat, cos_lat = np.sin(lat / 2), np.cos(lat / 2)
+    sin_lon, cos_lon = np.sin(lon / 2), np.cos(lon / 2)
+    sin_dlat = sin_lat[None, :] * cos_lat[:, None] - cos_lat[None, :] * sin_lat[:, None]
+    sin_dlon = sin_lon[None, :] * cos_lon[:, None] - cos_lon[None, :] * sin_lon[:, None]
+    cos_full = np.cos(lat)
+
+    a = sin_dlat**2 + cos_full[:, None] * cos_full[None, :] * sin_dlon**2
+    np.clip(a, 0.0, 1.0, out=a)
+    km = 6371.0 * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    np.fill_diagonal(km, 0.0)
+    return km
+
+
 def haversine_matrix(
     coords: List[Tuple[float, float]],
     fallback_speed_kmh: float = 25.0,
-) -> List[List[int]]:
+) -> np.ndarray:
     """
     Haversine-based travel time matrix in whole minutes for CVRPTW.
     coords: [(lat, lon), ...] ordered as nodes[0..N-1]
+    Returns an (N, N) int32 array.
     """
-    n = len(coords)
-    matrix: List[List[int]] = [[0] * n for _ in range(n)]
-    for i in range(n):
-        lat1, lon1 = coords[i]
-        for j in range(n):
-            if i == j:
-                continue
-            lat2, lon2 = coords[j]
-            sec = haversine_time_seconds(
-                lat1, lon1, lat2, lon2, speed_kmh=fallback_speed_kmh
-            )
-            minutes = max(0, int(round(sec / 60.0)))
-            matrix[i][j] = minutes
+    if len(coords) == 0:
+        return np.zeros((0, 0), dtype=np.int32)
+
+    minutes = np.rint(haversine_km_matrix(coords) / fallback_speed_kmh * 60.0)
+    return minutes.astype(np.int32)
+
+
+class _CircuitBreaker:
+    """
+    Skips OSRM after repeated failures so callers fall back immediately
+    instead of waiting out a timeout on every request.
 
-    return matrix
+    CLOSED: calls go through; failure_threshold consecutive failures open it.
+    OPEN: calls are refused until recovery_time has passed.
+    HALF_OPEN: calls go through again; one success closes the circuit, one
+    failure re-opens it for another recovery_time.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = OSRM_BREAKER_FAILURES,
+        recovery_time: float = OSRM_BREAKER_RECOVERY_SEC,
+    ):
+        self.failure_threshold = failure_threshold
+        self.recovery_time = recovery_time
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            return time.monotonic() - self._opened_at >= self.recovery_time
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("OSRM recovered, closing circuit breaker")
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._failures < self.failure_threshold:
+                return
+            if self._opened_at is None:
+                logger.warning(
+                    "OSRM failed %d times in a row, using Haversine for %.0fs",
+                    self._failures,
+                    self.recovery_time,
+                )
+            self._opened_at = time.monotonic()
 
 
 class OSRMClient:
@@ -60,20 +143,37 @@ class OSRMClient:
         self.timeout = settings.OSRM_TIMEOUT
         self.use_osrm = settings.USE_OSRM
         self._osrm_available: Optional[bool] = None
+        self._probe_ts = 0.0
+
+        # (duration s, distance km) per _pair_key, from OSRM only
+        self._route_cache: LRUCache = LRUCache(maxsize=ROUTE_CACHE_SIZE)
+        self._route_cache_lock = threading.Lock()
+
+        # Pooled keep-alive connections: OSRM calls are short, so a fresh
+        # TCP connect per request would dominate their latency
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._breaker = _CircuitBreaker()
 
     # internal
 
     def _check_osrm_available(self) -> bool:
-        """Lightweight health check with caching."""
-        if self._osrm_available is not None:
+        """Lightweight health check, cached for OSRM_PROBE_TTL_SEC."""
+        if (
+            self._osrm_available is not None
+            and time.monotonic() - self._probe_ts < OSRM_PROBE_TTL_SEC
+        ):
             return self._osrm_available
 
         try:
             url = f"{self.base_url}/route/v1/driving/0,0;0,0?overview=false"
-            resp = requests.get(url, timeout=2)
+            resp = self._session.get(url, timeout=2)
             self._osrm_available = resp.ok
         except Exception:
             self._osrm_available = False
+        self._probe_ts = time.monotonic()
 
         if not self._osrm_available:
             logger.warning("OSRM probe failed, will use Haversine fallback")
@@ -86,7 +186,58 @@ class OSRMClient:
             return False
         if override is False:
             return False
-        return self._check_osrm_available()
+        return self._check_osrm_available() and self._breaker.allow()
+
+    def _get(self, url: str) -> requests.Response:
+        """
+        GET through the circuit breaker. Connection errors and 5xx responses
+        are retried after a jittered backoff while the circuit stays closed;
+        timeouts are not, as they have already waited self.timeout.
+        """
+        for attempt in range(OSRM_MAX_ATTEMPTS):
+            if attempt:
+                backoff = min(OSRM_BACKOFF_CAP_SEC, OSRM_BACKOFF_BASE_SEC * 2**attempt)
+                time.sleep(random.uniform(0, backoff))
+            try:
+                resp = self._session.get(url, timeout=self.timeout)
+            except requests.exceptions.Timeout:
+                self._breaker.record_failure()
+                raise
+            except requests.exceptions.ConnectionError:
+                self._breaker.record_failure()
+                if attempt + 1 == OSRM_MAX_ATTEMPTS or not self._breaker.allow():
+                    raise
+                continue
+            if resp.status_code >= 500:
+                self._breaker.record_failure()
+                if attempt + 1 < OSRM_MAX_ATTEMPTS and self._breaker.allow():
+                    continue
+            else:
+                self._breaker.record_success()
+            return resp
+
+    def _route_pair(
+        self, lat1: float, lon1: float, lat2: float, lon2: float
+    ) -> Tuple[float, float]:
+        """(duration s, distance km) of the OSRM route between two points, memoized."""
+        key = _pair_key(lat1, lon1, lat2, lon2)
+        with self._route_cache_lock:
+            cached = self._route_cache.get(key)
+        if cached is not None:
+            return cached
+
+        url = (
+            f"{self.base_url}/route/v1/driving/"
+            f"{lon1},{lat1};{lon2},{lat2}?overview=false"
+        )
+        resp = self._get(url)
+        resp.raise_for_status()
+        data = orjson.loads(resp.content)
+        route = data["routes"][0]
+        result = (float(route["duration"]), float(route["distance"]) / 1000.0)
+        with self._route_cache_lock:
+            self._route_cache[key] = result
+        return result
 
     # pairwise API
 
@@ -103,14 +254,7 @@ class OSRMClient:
         """
         if self._should_use_osrm(use_osrm):
             try:
-                url = (
-                    f"{self.base_url}/route/v1/driving/"
-                    f"{lon1},{lat1};{lon2},{lat2}?overview=false"
-                )
-                resp = requests.get(url, timeout=self.timeout)
-                resp.raise_for_status()
-                data = resp.json()
-                duration = float(data["routes"][0]["duration"])
+                duration, _ = self._route_pair(lat1, lon1, lat2, lon2)
                 logger.debug("OSRM route duration: %.1fs", duration)
                 return duration
             except requests.exceptions.Timeout:
@@ -120,7 +264,6 @@ class OSRMClient:
                 )
             except requests.exceptions.ConnectionError:
                 logger.warning("OSRM route connection error, falling back to Haversine")
-                self._osrm_available = False
             except Exception as e:
                 logger.warning("OSRM route error: %s, falling back to Haversine", e)
 
@@ -142,14 +285,7 @@ class OSRMClient:
         """
         if self._should_use_osrm(use_osrm):
             try:
-                url = (
-                    f"{self.base_url}/route/v1/driving/"
-                    f"{lon1},{lat1};{lon2},{lat2}?overview=false"
-                )
-                resp = requests.get(url, timeout=self.timeout)
-                resp.raise_for_status()
-                data = resp.json()
-                distance = float(data["routes"][0]["distance"]) / 1000.0
+                _, distance = self._route_pair(lat1, lon1, lat2, lon2)
                 logger.debug("OSRM route distance: %.2fkm", distance)
                 return distance
             except requests.exceptions.Timeout:
@@ -161,7 +297,6 @@ class OSRMClient:
                 logger.warning(
                     "OSRM distance connection error, falling back to Haversine"
                 )
-                self._osrm_available = False
             except Exception as e:
                 logger.warning("OSRM distance error: %s, falling back to Haversine", e)
 
@@ -170,6 +305,68 @@ class OSRMClient:
         logger.debug("Haversine distance: %.2fkm", distance)
         return distance
 
+    def leg_distances(
+        self,
+        coords: List[Tuple[float, float]],
+        use_osrm: Optional[bool] = True,
+    ) -> List[float]:
+        """
+        Travel distance in km of each leg along coords, from one OSRM request.
+        Legs are shared with the route()/distance() cache.
+        coords: [(lat, lon), ...] in visiting order
+        """
+        if len(coords) < 2:
+            return []
+
+        if self._should_use_osrm(use_osrm):
+            keys = [_pair_key(*a, *b) for a, b in zip(coords, coords[1:])]
+            with self._route_cache_lock:
+                cached = [self._route_cache.get(key) for key in keys]
+            if all(leg is not None for leg in cached):
+                return [distance for _, distance in cached]
+
+            try:
+                coord_str = ";".join(f"{lon},{lat}" for (lat, lon) in coords)
+                # continue_straight=false routes each leg as distance() would
+                # route that pair on its own
+                url = (
+                    f"{self.base_url}/route/v1/driving/{coord_str}"
+                    "?overview=false&continue_straight=false"
+                )
+                resp = self._get(url)
+                resp.raise_for_status()
+                data = orjson.loads(resp.content)
+                legs = data["routes"][0]["legs"]
+                if len(legs) != len(coords) - 1:
+                    raise ValueError(
+                        f"OSRM route returned {len(legs)} legs for {len(coords)} points"
+                    )
+                results = [
+                    (float(leg["duration"]), float(leg["distance"]) / 1000.0)
+                    for leg in legs
+                ]
+                with self._route_cache_lock:
+                    for key, result in zip(keys, results):
+                        self._route_cache[key] = result
+                distances = [distance for _, distance in results]
+                logger.debug("OSRM leg distances: %d legs", len(distances))
+                return distances
+            except requests.exceptions.Timeout:
+                logger.warning(
+                    "OSRM legs timeout after %ss, falling back to Haversine",
+                    self.timeout,
+                )
+            except requests.exceptions.ConnectionError:
+                logger.warning("OSRM legs connection error, falling back to Haversine")
+            except Exception as e:
+                logger.warning("OSRM legs error: %s, falling back to Haversine", e)
+
+        # Fallback
+        return [
+            haversine_distance_km(lat1, lon1, lat2, lon2)
+            for (lat1, lon1), (lat2, lon2) in zip(coords, coords[1:])
+        ]
+
     # matrix API for CVRPTW
 
     def matrix_minutes(
@@ -177,16 +374,31 @@ class OSRMClient:
         coords: List[Tuple[float, float]],
         use_osrm: Optional[bool] = True,
         fallback_speed_kmh: float = 25.0,
-    ) -> List[List[int]]:
+    ) -> np.ndarray:
         """
-        NxN travel time matrix in whole minutes for CVRPTW.
+        NxN travel time matrix in whole minutes for CVRPTW, as int32.
         coords: [(lat, lon), ...] ordered as nodes[0..N-1]
+        Not cached here: travel_matrix_for_pois in cvrptw caches OSRM
+        matrices in memory and on disk.
+        """
+        return self.matrix_minutes_with_source(coords, use_osrm, fallback_speed_kmh)[0]
+
+    def matrix_minutes_with_source(
+        self,
+        coords: List[Tuple[float, float]],
+        use_osrm: Optional[bool] = True,
+        fallback_speed_kmh: float = 25.0,
+    ) -> Tuple[np.ndarray, bool]:
+        """
+        Like matrix_minutes, but also reports where the matrix came from.
+
+        Returns (matrix, from_osrm); from_osrm is False for the Haversine
+        fallback, so callers can avoid persisting an estimate as if it were
+        road travel times.
         """
         n = len(coords)
-        if n == 0:
-            return []
-        if n == 1:
-            return [[0]]
+        if n <= 1:
+            return np.zeros((n, n), dtype=np.int32), False
 
         if n > MAX_OSRM_NODES:
             logger.info(
@@ -194,7 +406,7 @@ class OSRMClient:
                 n,
                 MAX_OSRM_NODES,
             )
-            return haversine_matrix(coords, fallback_speed_kmh)
+            return haversine_matrix(coords, fallback_speed_kmh), False
 
         # Try OSRM /table
         if self._should_use_osrm(use_osrm):
@@ -203,24 +415,24 @@ class OSRMClient:
                 url = (
                     f"{self.base_url}/table/v1/driving/{coord_str}?annotations=duration"
                 )
-                resp = requests.get(url, timeout=self.timeout)
+                resp = self._get(url)
                 resp.raise_for_status()
-                data = resp.json()
+                data = orjson.loads(resp.content)
                 durations = data.get("durations")
                 if not durations:
                     raise ValueError("OSRM /table missing 'durations'")
 
-                # OSRM returns seconds; convert to int minutes
-                matrix: List[List[int]] = [[0] * n for _ in range(n)]
-                for i in range(n):
-                    row = durations[i]
-                    for j in range(n):
-                        sec = row[j] if row[j] is not None else 0.0
-                        minutes = max(0, int(round(float(sec) / 60.0)))
-                        matrix[i][j] = minutes
-
+                # OSRM returns seconds (null when unroutable); convert to
+                # int minutes, rounding half to even like round()
+                seconds = np.asarray(durations, dtype=np.float64)
+                if seconds.shape != (n, n):
+                    raise ValueError(
+                        f"OSRM /table returned {seconds.shape} for {n} nodes"
+                    )
+                np.nan_to_num(seconds, copy=False, nan=0.0)
+                minutes = np.maximum(np.rint(seconds / 60.0), 0.0).astype(np.int32)
                 logger.info("OSRM matrix computed: %d nodes", n)
-                return matrix
+                return minutes, True
 
             except requests.exceptions.Timeout:
                 logger.warning(
@@ -231,26 +443,16 @@ class OSRMClient:
                 logger.warning(
                     "OSRM /table connection error, falling back to Haversine matrix"
                 )
-                self._osrm_available = False
             except Exception as e:
                 logger.warning("OSRM /table error: %s, falling back to Haversine", e)
 
         # Fallback: Haversine-based matrix in minutes
         logger.info("Using Haversine fallback matrix for %d nodes", n)
-        matrix: List[List[int]] = [[0] * n for _ in range(n)]
-        for i in range(n):
-            lat1, lon1 = coords[i]
-            for j in range(n):
-                if i == j:
-                    continue
-                lat2, lon2 = coords[j]
-                sec = haversine_time_seconds(
-                    lat1, lon1, lat2, lon2, speed_kmh=fallback_speed_kmh
-                )
-                minutes = max(0, int(round(sec / 60.0)))
-                matrix[i][j] = minutes
-
-        return matrix
+        return haversine_matrix(coords, fallback_speed_kmh), False
 
 
+# One client per process. Pipelines run in worker processes (see
+# app/api/itinerary.py), so each worker has its own route cache,
+# connection pool and circuit breaker; the locks guard the threads within a
+# worker (e.g. concurrent day-distance requests).
 osrm_client = OSRMClient()
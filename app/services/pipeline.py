@@ -1,26 +1,15 @@
 from __future__ import annotations
 
-import numpy as np
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
 from app.services.cvrptw import run_cvrptw
 from app.services.ant_colony_opt import AntColonyOptimizer, ACOConfig
+from app.services.osrm import haversine_km_matrix
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-
-def haversine_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    """Calculate haversine distance in km between two coordinates."""
-    from math import radians, sin, cos, sqrt, atan2
-
-    R = 6371.0  # Earth radius in km
-    dlat = radians(lat2 - lat1)
-    dlon = radians(lon2 - lon1)
-    a = (
-        sin(dlat / 2) ** 2
-        + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlon / 2) ** 2
-    )
-    return R * 2 * atan2(sqrt(a), sqrt(1 - a))
+OSRM_CONCURRENCY = 8  # max day-distance OSRM requests in flight per pipeline run
 
 
 def optimize_day_route_with_aco(
@@ -58,21 +47,8 @@ def optimize_day_route_with_aco(
             return stops
         coordinates.append([lat, lon])
 
-    coords_array = np.array(coordinates, dtype=np.float64)
-
-    # Build distance matrix
-    n = len(coords_array)
-    dist_matrix = np.zeros((n, n), dtype=np.float64)
-    for i in range(n):
-        for j in range(i + 1, n):
-            dist = haversine_distance(
-                coords_array[i][0],
-                coords_array[i][1],
-                coords_array[j][0],
-                coords_array[j][1],
-            )
-            dist_matrix[i, j] = dist
-            dist_matrix[j, i] = dist
+    # Build distance matrix (km)
+    dist_matrix = haversine_km_matrix(coordinates)
 
     # Run ACO
     aco_config = config or ACOConfig(
@@ -199,6 +175,8 @@ def run_full_pipeline(
                 "days": [],
             }
 
+        poi_lookup = _build_poi_lookup(maut_output)
+
         # Step 2: Apply ACO algorithm to refine daily routes
         if use_aco:
             logger.info("Applying ACO algorithm to optimize intra-day route sequences...")
@@ -206,7 +184,7 @@ def run_full_pipeline(
                 original_stops = day.get("stops", [])
 
                 # Enrich CVRPTW solution with coordinates
-                enriched_cvrptw_stops = _enrich_stops_with_coords(original_stops, maut_output)
+                enriched_cvrptw_stops = _enrich_stops_with_coords(original_stops, poi_lookup)
                 day["stops_cvrptw"] = enriched_cvrptw_stops
 
                 if len(enriched_cvrptw_stops) > 2:
@@ -219,21 +197,26 @@ def run_full_pipeline(
                     # Too few POIs to bother optimizing; keep CVRPTW order
                     day["stops_aco"] = enriched_cvrptw_stops
                     day["optimization_method"] = "cvrptw"
-
-                # Distances: both paths use the same distance function and full coords
-                day["total_distance_cvrptw"] = _calculate_day_distance(day["stops_cvrptw"])
-                day["total_distance_aco"] = _calculate_day_distance(day["stops_aco"])
-                day["total_distance"] = day["total_distance_aco"]  # primary metric
         else:
             # CVRPTW only: still enrich stops so distance isn't 0
             for day in cvrptw_output["days"]:
                 original_stops = day.get("stops", [])
-                enriched_cvrptw_stops = _enrich_stops_with_coords(original_stops, maut_output)
+                enriched_cvrptw_stops = _enrich_stops_with_coords(original_stops, poi_lookup)
                 day["stops_cvrptw"] = enriched_cvrptw_stops
                 day["optimization_method"] = "cvrptw"
-                day["total_distance_cvrptw"] = _calculate_day_distance(day["stops_cvrptw"])
-                day["total_distance"] = day["total_distance_cvrptw"]
 
+        # Distances: both paths use the same distance function and full coords;
+        # the ACO order is the primary metric when it ran
+        methods = ["cvrptw", "aco"] if use_aco else ["cvrptw"]
+        distances = iter(
+            _calculate_day_distances(
+                [day[f"stops_{m}"] for day in cvrptw_output["days"] for m in methods]
+            )
+        )
+        for day in cvrptw_output["days"]:
+            for m in methods:
+                day[f"total_distance_{m}"] = next(distances)
+            day["total_distance"] = day[f"total_distance_{methods[-1]}"]
 
         # Step 3: Calculate overall metrics
         total_distance = sum(
@@ -268,20 +251,16 @@ def run_full_pipeline(
         }
 
 
-def _enrich_stops_with_coords(
-    stops: List[Dict[str, Any]], maut_output: Dict[str, Any]
-) -> List[Dict[str, Any]]:
+def _build_poi_lookup(maut_output: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
     """
-    Enrich stops with full coordinate information from MAUT output.
+    Map POI id -> {"latitude", "longitude"} from MAUT output places.
 
     Args:
-        stops: List of stops from CVRPTW (may have limited info)
         maut_output: Full MAUT output with POI details
 
     Returns:
-        Enriched stops with coordinates
+        Coordinate lookup for _enrich_stops_with_coords
     """
-    # Build POI lookup from MAUT output
     poi_lookup = {}
     for poi in maut_output.get("places", []):
         poi_id = poi.get("id")
@@ -299,14 +278,29 @@ def _enrich_stops_with_coords(
                     "longitude": poi.get("longitude"),
                 }
 
-    # Enrich stops
+    return poi_lookup
+
+
+def _enrich_stops_with_coords(
+    stops: List[Dict[str, Any]], poi_lookup: Dict[str, Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Enrich stops with full coordinate information from MAUT output.
+
+    Args:
+        stops: List of stops from CVRPTW (may have limited info)
+        poi_lookup: Coordinate lookup from _build_poi_lookup
+
+    Returns:
+        Enriched stops with coordinates
+    """
     enriched = []
     for stop in stops:
         stop_copy = stop.copy()
         poi_id = stop.get("poi_id", "")
 
         # Strip _dayX suffix if present
-        base_poi_id = poi_id.rsplit("_day", 1)[0]
+        base_poi_id = poi_id.rpartition("_day")[0] if "_day" in poi_id else poi_id
 
         # Try to find coordinates
         if base_poi_id in poi_lookup:
@@ -319,6 +313,20 @@ def _enrich_stops_with_coords(
     return enriched
 
 
+def _calculate_day_distances(routes: List[List[Dict[str, Any]]]) -> List[float]:
+    """
+    _calculate_day_distance for each route. With OSRM enabled every route is
+    an HTTP round-trip, so they are fetched concurrently.
+    """
+    from app.services.osrm import osrm_client
+
+    if not osrm_client.use_osrm or len(routes) < 2:
+        return [_calculate_day_distance(stops) for stops in routes]
+
+    with ThreadPoolExecutor(max_workers=min(len(routes), OSRM_CONCURRENCY)) as pool:
+        return list(pool.map(_calculate_day_distance, routes))
+
+
 def _calculate_day_distance(stops: List[Dict[str, Any]]) -> float:
     """
     Calculate total distance for a day's route.
@@ -335,20 +343,21 @@ def _calculate_day_distance(stops: List[Dict[str, Any]]) -> float:
     # Import here to avoid circular dependency
     from app.services.osrm import osrm_client
 
-    total = 0.0
-    for i in range(len(stops) - 1):
-        lat1 = stops[i].get("latitude") or stops[i].get("coordinates", {}).get("lat")
-        lon1 = stops[i].get("longitude") or stops[i].get("coordinates", {}).get("lng")
-        lat2 = stops[i + 1].get("latitude") or stops[i + 1].get("coordinates", {}).get(
-            "lat"
-        )
-        lon2 = stops[i + 1].get("longitude") or stops[i + 1].get("coordinates", {}).get(
-            "lng"
-        )
+    # Split into runs of consecutive stops with coordinates: legs touching a
+    # stop without them are not counted
+    runs: List[List[Tuple[float, float]]] = [[]]
+    for stop in stops:
+        lat = stop.get("latitude") or stop.get("coordinates", {}).get("lat")
+        lon = stop.get("longitude") or stop.get("coordinates", {}).get("lng")
+        if lat is None or lon is None:
+            runs.append([])
+        else:
+            runs[-1].append((lat, lon))
 
-        if all(x is not None for x in [lat1, lon1, lat2, lon2]):
-            # Use OSRM if available and requested, otherwise Haversine
-            distance = osrm_client.distance(lat1, lon1, lat2, lon2)
+    total = 0.0
+    for run in runs:
+        # One OSRM request per run (OSRM if available, otherwise Haversine)
+        for distance in osrm_client.leg_distances(run):
             total += distance
 
     return round(total, 2)
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from app.utils.logger import get_logger
 
@@ -170,50 +170,66 @@ def transform_poi_to_frontend(poi: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Frontend-formatted POI dict
     """
+    get = poi.get
+
     # Extract coordinates
-    coords = None
-    if poi.get("coordinates"):
-        coords = poi["coordinates"]
-    elif poi.get("latitude") is not None and poi.get("longitude") is not None:
-        coords = {"lat": float(poi["latitude"]), "lng": float(poi["longitude"])}
+    coords = get("coordinates")
+    if not coords:
+        lat, lng = get("latitude"), get("longitude")
+        coords = (
+            {"lat": float(lat), "lng": float(lng)}
+            if lat is not None and lng is not None
+            else None
+        )
 
     # Get category (first from categories array or single category field)
-    category = None
-    if poi.get("categories") and len(poi["categories"]) > 0:
-        category = poi["categories"][0]
-    elif poi.get("category"):
-        category = poi["category"]
+    categories = get("categories")
+    category = categories[0] if categories else (get("category") or None)
 
     # Derive location from complete_address
     location = None
-    complete_addr = poi.get("complete_address")
+    complete_addr = get("complete_address")
     if isinstance(complete_addr, dict):
         # Priority: city > country
         location = complete_addr.get("city") or complete_addr.get("country")
 
     return {
-        "id": poi.get("id"),
-        "name": poi.get("name"),
+        "id": get("id"),
+        "name": get("name"),
         "category": category,
-        "categories": poi.get("categories", [category] if category else []),
-        "rating": poi.get("review_rating") or poi.get("rating"),
-        "reviewCount": poi.get("review_count") or poi.get("reviewCount"),
+        "categories": get("categories", [category] if category else []),
+        "rating": get("review_rating") or get("rating"),
+        "reviewCount": get("review_count") or get("reviewCount"),
         "location": location,
-        "images": poi.get("images", []),
-        "description": poi.get("description") or poi.get("descriptions"),
+        "images": get("images", []),
+        "description": get("description") or get("descriptions"),
         # "latitude": coords["lat"] if coords else None,
         # "longitude": coords["lng"] if coords else None,
         "coordinates": coords,
-        "website": poi.get("website"),
-        "googleMapsUrl": poi.get("googleMapsUrl") or poi.get("google_map_link"),
-        "address": poi.get("address"),
-        "phone": poi.get("phone"),
-        "openHours": poi.get("open_hours"),
-        "priceLevel": poi.get("price_level") or poi.get("priceLevel"),
-        "roles": poi.get("poi_roles", []),
+        "website": get("website"),
+        "googleMapsUrl": get("googleMapsUrl") or get("google_map_link"),
+        "address": get("address"),
+        "phone": get("phone"),
+        "openHours": get("open_hours"),
+        "priceLevel": get("price_level") or get("priceLevel"),
+        "roles": get("poi_roles", []),
     }
 
 
+def transform_pois_to_frontend(pois: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Transform a page of POIs to frontend format in a single pass.
+
+    Args:
+        pois: Internal POI dicts (Supabase rows or MAUT places)
+
+    Returns:
+        Frontend-formatted POI dicts, in input order
+    """
+    transform = transform_poi_to_frontend
+    return [transform(p) for p in pois]
+
+
 def transform_response_to_frontend(
     output: Dict[str, Any],
 ) -> Dict[str, Any]:
@@ -228,9 +244,9 @@ def transform_response_to_frontend(
         Frontend plan dict with transformed POIs
     """
     # Transform POIs
-    items = []
-    for poi in output.get("items") or output.get("places") or []:
-        items.append(transform_poi_to_frontend(poi))
+    items = transform_pois_to_frontend(
+        output.get("items") or output.get("places") or []
+    )
 
     # Build plan structure
     return {
@@ -1,5 +1,8 @@
+from collections import Counter
 from typing import Dict, List, Any
+import bisect
 import datetime as dt
+import functools
 
 
 # Configuration
@@ -19,10 +22,15 @@ DEFAULT_HOURS = {
 
 MAX_DAY_OVERRUN_MIN = 60  # Allow 1 hour past day end
 
+# MEAL_WINDOWS as (start, end, meal) sorted by start, for bisect in get_meal_type
+_MEAL_TABLE = sorted((start, end, meal) for meal, (start, end) in MEAL_WINDOWS.items())
+_MEAL_STARTS = [start for start, _, _ in _MEAL_TABLE]
+
 
 # Helper Functions
 
 
+@functools.lru_cache(maxsize=2048)  # at most 1440 distinct "HH:MM" strings
 def time_to_minutes(time_str: str) -> int:
     """Convert 'HH:MM' to minutes from midnight."""
     h, m = map(int, time_str.split(":"))
@@ -31,14 +39,11 @@ def time_to_minutes(time_str: str) -> int:
 
 def get_meal_type(arrival_min: int) -> str:
     """Determine meal type based on arrival time."""
-    if MEAL_WINDOWS["breakfast"][0] <= arrival_min <= MEAL_WINDOWS["breakfast"][1]:
-        return "breakfast"
-    elif MEAL_WINDOWS["lunch"][0] <= arrival_min <= MEAL_WINDOWS["lunch"][1]:
-        return "lunch"
-    elif MEAL_WINDOWS["dinner"][0] <= arrival_min <= MEAL_WINDOWS["dinner"][1]:
-        return "dinner"
-    else:
-        return "other"
+    # Last window starting at or before arrival; windows are inclusive
+    i = bisect.bisect_right(_MEAL_STARTS, arrival_min) - 1
+    if i >= 0 and arrival_min <= _MEAL_TABLE[i][1]:
+        return _MEAL_TABLE[i][2]
+    return "other"
 
 
 # Validation Functions
@@ -77,24 +82,27 @@ def validate_itinerary(
         "packed": 22 * 60,  # 10pm
     }
     day_end = day_end_times.get(pacing, 20 * 60)
+    theme_counts: Counter = Counter()
 
     for day_idx, day in enumerate(cvrptw_output.get("days", [])):
         day_num = day_idx + 1
         stops = day.get("stops", [])
         meals_today = 0
         prev_stop = None
-
-        stats["total_stops"] += len([s for s in stops if s["role"] != "hotel"])
+        weekday = None  # parsed from day["date"] on first use
 
         for stop_idx, stop in enumerate(stops):
-            poi_id_base = stop["poi_id"].rsplit("_day", 1)[0]
+            poi_id = stop["poi_id"]
+            poi_id_base = poi_id.rpartition("_day")[0] if "_day" in poi_id else poi_id
             poi = poi_lookup.get(poi_id_base)
+            themes = poi.get("themes", []) if poi else []
 
+            role = stop["role"]
             arrival_min = time_to_minutes(stop["arrival"])
             depart_min = time_to_minutes(stop["depart"])
 
             # Skip hotel stops for most checks
-            if stop["role"] == "hotel":
+            if role == "hotel":
                 # Check day overrun
                 if arrival_min > day_end + MAX_DAY_OVERRUN_MIN:
                     overrun = arrival_min - day_end
@@ -111,8 +119,10 @@ def validate_itinerary(
                     stats["day_overruns"].append(overrun)
                 continue
 
+            stats["total_stops"] += 1
+
             # 1. Check consecutive meals
-            if prev_stop and prev_stop["role"] == "meal" and stop["role"] == "meal":
+            if role == "meal" and prev_stop and prev_stop["role"] == "meal":
                 violations.append(
                     {
                         "type": "consecutive_meals",
@@ -124,7 +134,7 @@ def validate_itinerary(
                 )
 
             # 2. Check meal timing
-            if stop["role"] == "meal":
+            if role == "meal":
                 meals_today += 1
                 meal_type = get_meal_type(arrival_min)
 
@@ -141,30 +151,29 @@ def validate_itinerary(
                     )
 
             # 3. Check POI opening hours
-            if poi and stop["role"] != "hotel":
+            if poi and role != "hotel":
                 open_hours = poi.get("openHours")
-                themes = poi.get("themes", [])
 
                 # Determine expected hours
                 if not open_hours:
                     # Default hours based on POI type
                     if "nature" in themes:
                         expected_hours = DEFAULT_HOURS["nature"]
-                    elif stop["role"] == "meal":
+                    elif role == "meal":
                         expected_hours = DEFAULT_HOURS["meal"]
                     else:
                         expected_hours = DEFAULT_HOURS["attraction"]
                 else:
                     # Parse actual hours for the day
-                    date_str = day["date"]
-                    date_obj = dt.date.fromisoformat(date_str)
-                    weekday = date_obj.strftime("%A")
+                    if weekday is None:
+                        weekday = dt.date.fromisoformat(day["date"]).strftime("%A")
 
                     day_hours = open_hours.get(weekday, [])
+                    hours_text = str(day_hours).lower()
                     if not day_hours:
                         # No hours specified, use default
                         expected_hours = DEFAULT_HOURS["attraction"]
-                    elif "closed" in str(day_hours).lower():
+                    elif "closed" in hours_text:
                         violations.append(
                             {
                                 "type": "poi_closed",
@@ -176,7 +185,7 @@ def validate_itinerary(
                         )
                         prev_stop = stop
                         continue
-                    elif "open 24 hours" in str(day_hours).lower():
+                    elif "open 24 hours" in hours_text:
                         # Open 24 hours - skip validation
                         expected_hours = (0, 24 * 60)
                     else:
@@ -200,18 +209,15 @@ def validate_itinerary(
                         )
 
             # Track themes
-            if poi:
-                themes = poi.get("themes", [])
-                for theme in themes:
-                    stats["theme_distribution"][theme] = (
-                        stats["theme_distribution"].get(theme, 0) + 1
-                    )
+            theme_counts.update(themes)
 
             prev_stop = stop
 
         stats["meals_per_day"].append(meals_today)
         stats["total_meals"] += meals_today
 
+    stats["theme_distribution"] = dict(theme_counts)
+
     # 4. Check meals per day
     for day_idx, meal_count in enumerate(stats["meals_per_day"]):
         if meal_count < 1:
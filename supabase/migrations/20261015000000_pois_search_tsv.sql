@@ -0,0 +1,12 @@
+-- Full-text search over POI name/description/address for /api/search.
+-- Replaces the three leading-wildcard ILIKE scans with a GIN-indexed tsvector.
+
+ALTER TABLE pois
+    ADD COLUMN IF NOT EXISTS search_tsv tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(descriptions, '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(address, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS pois_search_tsv_idx ON pois USING GIN (search_tsv);
@@ -56,3 +56,20 @@ def test_ant_colony_optimization():
     print(
         f"✅ Distance improvement over naive: {((naive_distance - best_distance) / naive_distance * 100):.1f}%"
     )
+
+
+def test_ant_colony_independent_colonies():
+    np.random.seed(7)
+    cities = np.random.rand(30, 2) * 100
+    dist_matrix = create_distance_matrix(cities)
+
+    config = ACOConfig(n_ants=20, n_iterations=40, beta=3.0)
+    aco = AntColonyOptimizer(dist_matrix, config, np.random.RandomState(0))
+    best_path, best_distance = aco.optimize_iac(n_colonies=4)
+
+    n = len(cities)
+    assert sorted(best_path.tolist()) == list(range(n)), "IAC path is not a tour"
+    tour = dist_matrix[best_path, np.roll(best_path, -1)].sum()
+    assert abs(tour - best_distance) < 1e-6, "IAC distance does not match its path"
+    assert aco.best_distance == best_distance
+    assert len(aco.history) == config.n_iterations // 4
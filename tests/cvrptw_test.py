@@ -1,7 +1,21 @@
 import os
 import json
+import time
+import datetime as dt
+import numpy as np
+import pytest
+from cachetools import TTLCache
+from app.services import cvrptw
 from app.services.maut import run_pipeline
-from app.services.cvrptw import run_cvrptw
+from app.services.cvrptw import (
+    DaySpec,
+    Node,
+    _add_poi_node,
+    run_cvrptw,
+    solve_cvrptw,
+    travel_matrix_for_pois,
+)
+from app.services.osrm import osrm_client, haversine_matrix
 
 MAUT_TEST_PATH = os.path.join(os.path.dirname(__file__), "maut_test.json")
 
@@ -68,5 +82,220 @@ def test_cvrptw_with_maut():
         print(f"   Day {i + 1}: {len(day['stops'])} stops, {day['meals']} meals")
 
 
+@pytest.fixture
+def matrix_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cvrptw, "MATRIX_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(
+        cvrptw, "_matrix_memo", TTLCache(maxsize=32, ttl=cvrptw.MATRIX_CACHE_TTL_SEC)
+    )
+    return tmp_path
+
+
+def _stub_osrm_matrix(monkeypatch, from_osrm: bool) -> list:
+    """Serve Haversine times labelled as OSRM or fallback; record each call."""
+    calls = []
+
+    def matrix_minutes_with_source(coords, use_osrm=True, fallback_speed_kmh=25.0):
+        calls.append(len(coords))
+        return haversine_matrix(coords, fallback_speed_kmh), from_osrm
+
+    monkeypatch.setattr(
+        osrm_client, "matrix_minutes_with_source", matrix_minutes_with_source
+    )
+    return calls
+
+
+POI_IDS = ["c", "a", "b"]
+POI_COORDS = np.array([[1.30, 103.85], [1.28, 103.84], [1.35, 103.99]])
+
+
+def test_fallback_matrix_is_not_cached(matrix_cache, monkeypatch):
+    calls = _stub_osrm_matrix(monkeypatch, from_osrm=False)
+
+    travel_matrix_for_pois(POI_IDS, POI_COORDS)
+    travel_matrix_for_pois(POI_IDS, POI_COORDS)
+
+    assert calls == [3, 3]
+    assert not list(matrix_cache.iterdir())
+
+
+def test_osrm_matrix_disk_cache_keys_on_coordinates(matrix_cache, monkeypatch):
+    calls = _stub_osrm_matrix(monkeypatch, from_osrm=True)
+
+    first = travel_matrix_for_pois(POI_IDS, POI_COORDS)
+    cvrptw._matrix_memo.clear()
+    assert np.array_equal(travel_matrix_for_pois(POI_IDS, POI_COORDS), first)
+    assert calls == [3]
+    assert len(list(matrix_cache.glob("*.npy"))) == 1
+
+    # The same IDs at a moved location need fresh travel times
+    cvrptw._matrix_memo.clear()
+    moved = POI_COORDS.copy()
+    moved[0] = [1.40, 103.70]
+    travel_matrix_for_pois(POI_IDS, moved)
+    assert calls == [3, 3]
+    assert len(list(matrix_cache.glob("*.npy"))) == 2
+
+
+def test_matrix_memo_slices_supersets_at_same_coordinates(matrix_cache, monkeypatch):
+    calls = _stub_osrm_matrix(monkeypatch, from_osrm=True)
+
+    first = travel_matrix_for_pois(POI_IDS, POI_COORDS)
+    for path in matrix_cache.glob("*.npy"):
+        path.unlink()  # only the in-memory superset can answer now
+
+    sub = travel_matrix_for_pois(["b", "c"], POI_COORDS[[2, 0]])
+    assert np.array_equal(sub, first[np.ix_([2, 0], [2, 0])])
+    assert calls == [3]
+
+    # A moved POI is not sliced out of the stale superset
+    travel_matrix_for_pois(["b", "c"], np.array([[1.35, 103.99], [1.40, 103.70]]))
+    assert calls == [3, 2]
+
+
+def test_fallback_matrix_is_not_memoized(matrix_cache, monkeypatch):
+    calls = _stub_osrm_matrix(monkeypatch, from_osrm=False)
+
+    travel_matrix_for_pois(POI_IDS, POI_COORDS)
+    travel_matrix_for_pois(["a", "b"], POI_COORDS[[1, 2]])
+
+    assert calls == [3, 2]
+    assert len(cvrptw._matrix_memo) == 0
+
+
+def test_matrix_cache_expires_and_is_bounded(matrix_cache, monkeypatch):
+    calls = _stub_osrm_matrix(monkeypatch, from_osrm=True)
+    monkeypatch.setattr(cvrptw, "MATRIX_CACHE_MAX_FILES", 2)
+
+    for shift in range(3):
+        cvrptw._matrix_memo.clear()
+        travel_matrix_for_pois(POI_IDS, POI_COORDS + shift)
+    assert len(list(matrix_cache.glob("*.npy"))) == 2
+
+    # An expired file is a miss even on disk
+    cvrptw._matrix_memo.clear()
+    for path in matrix_cache.glob("*.npy"):
+        old = path.stat().st_mtime - cvrptw.MATRIX_CACHE_TTL_SEC - 1
+        os.utime(path, (old, old))
+    travel_matrix_for_pois(POI_IDS, POI_COORDS + 2)
+    assert calls == [3, 3, 3, 3]
+
+
+def _day_specs(num_days: int) -> list:
+    start = dt.date(2025, 3, 3)
+    return [
+        DaySpec(
+            day_index=k,
+            date=start + dt.timedelta(days=k),
+            start_min=9 * 60,
+            end_min=20 * 60,
+            depot_id="hotel",
+        )
+        for k in range(num_days)
+    ]
+
+
+def _node(idx, poi_id, role, windows_by_day, is_mandatory=False) -> Node:
+    return Node(
+        idx=idx,
+        poi_id=poi_id,
+        name=poi_id,
+        role=role,
+        lat=1.3,
+        lon=103.8,
+        service={"depot": 0, "meal": 45, "attraction": 60}[role],
+        themes=[poi_id] if role == "attraction" else None,
+        windows_by_day=windows_by_day,
+        is_mandatory=is_mandatory,
+    )
+
+
+def _one_node_per_poi_problem():
+    """2 days: shared, single-day, pinned and out-of-trip POIs plus meals."""
+    day_specs = _day_specs(2)
+    both_days = {0: [(9 * 60, 19 * 60)], 1: [(9 * 60, 19 * 60)]}
+    lunch = {0: [(11 * 60, 14 * 60)], 1: [(11 * 60, 14 * 60)]}
+    dinner = {0: [(16 * 60, 20 * 60)], 1: [(16 * 60, 20 * 60)]}
+    nodes = [
+        _node(0, "hotel", "depot", {0: [(540, 1200)], 1: [(540, 1200)]}),
+        _node(1, "museum", "attraction", both_days),
+        _node(2, "park", "attraction", both_days),
+        _node(3, "monday_only", "attraction", {0: [(10 * 60, 16 * 60)]}),
+        _node(4, "pinned", "attraction", {1: [(15 * 60, 16 * 60)]}, True),
+        _node(5, "outside_trip", "attraction", {5: [(10 * 60, 11 * 60)]}, True),
+        _node(6, "lunch_a", "meal", lunch),
+        _node(7, "lunch_b", "meal", lunch),
+        _node(8, "dinner_a", "meal", dinner),
+        _node(9, "dinner_b", "meal", dinner),
+    ]
+    travel = np.full((len(nodes), len(nodes)), 10, dtype=np.int32)
+    np.fill_diagonal(travel, 0)
+    return day_specs, nodes, travel
+
+
+def test_solver_one_node_per_poi():
+    day_specs, nodes, travel = _one_node_per_poi_problem()
+
+    result = solve_cvrptw(day_specs, nodes, travel, time_limit_sec=5)
+
+    stops_by_day = [
+        {s["poi_id"]: s for s in day["stops"] if s["role"] != "hotel"}
+        for day in result["days"]
+    ]
+    visited = [poi_id for day in stops_by_day for poi_id in day]
+    # Each POI is a single node: visited at most once across the trip
+    assert len(visited) == len(set(visited))
+    # Multi-day POIs are scheduled once, on either day
+    assert {"museum", "park"} <= set(visited)
+    # Day-restricted and pinned POIs ride only on their own day
+    assert "monday_only" in stops_by_day[0]
+    assert "15:00" <= stops_by_day[1]["pinned"]["arrival"] <= "16:00"
+    # A POI pinned outside the trip is never routed
+    assert "outside_trip" not in visited
+    # Meal nodes are shared between days but each day still gets two meals
+    for day in result["days"]:
+        assert day["meals"] == 2
+    for day in stops_by_day:
+        for poi_id in ("lunch_a", "lunch_b"):
+            if poi_id in day:
+                assert "11:00" <= day[poi_id]["arrival"] <= "14:00"
+
+
+def test_solver_fallback_fits_time_limit():
+    # SAVINGS finds no first solution here, so the cheapest-arc retry runs
+    day_specs, nodes, travel = _one_node_per_poi_problem()
+
+    started = time.monotonic()
+    result = solve_cvrptw(day_specs, nodes, travel, time_limit_sec=1)
+    elapsed = time.monotonic() - started
+
+    assert result["days"], result.get("note")
+    assert elapsed < 1.5  # time_limit_sec plus model building
+
+
+def test_mandatory_poi_outside_trip_is_not_added():
+    day_specs = _day_specs(2)
+    mandatory = {
+        "in_trip": {"day": 2, "window": ["10:00", "11:00"]},
+        "after_trip": {"day": 3, "window": ["10:00", "11:00"]},
+    }
+    nodes = []
+    for poi_id in ("in_trip", "after_trip", "free"):
+        poi = {
+            "id": poi_id,
+            "name": poi_id,
+            "themes": ["nature"],
+            "coordinates": {"lat": 1.3, "lng": 103.8},
+        }
+        _add_poi_node(
+            poi, "attraction", nodes, len(nodes), day_specs, "balanced", mandatory
+        )
+
+    assert [n.poi_id for n in nodes] == ["in_trip", "free"]
+    assert nodes[0].is_mandatory
+    assert nodes[0].windows_by_day == {1: [(600, 660)]}
+    assert set(nodes[1].windows_by_day) == {0, 1}
+
+
 if __name__ == "__main__":
     test_cvrptw_with_maut()
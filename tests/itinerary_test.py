@@ -0,0 +1,159 @@
+import asyncio
+import os
+import signal
+import orjson
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+import zstandard as zstd
+from app.api import itinerary
+
+
+@pytest.fixture
+def storage_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(itinerary, "get_storage_dir", lambda: tmp_path)
+    return tmp_path
+
+
+def _itinerary(n: int = 0) -> dict:
+    return {
+        "status": "success",
+        "meta": {"destination": "Penang", "num_days": n, "ideas": ["x"]},
+        "plan": {"status": "ok", "days": [{"day": 1, "stops": []}]},
+    }
+
+
+def _listed() -> list:
+    response = asyncio.run(itinerary.list_itineraries())
+    return orjson.loads(response.body)
+
+
+def test_save_load_list_delete(storage_dir):
+    data = _itinerary(3)
+    asyncio.run(itinerary.save_itinerary("a", data))
+
+    assert asyncio.run(itinerary.load_itinerary("a")) == data
+    # Index entries carry the meta without the plan or ideas
+    assert _listed() == [
+        {
+            "itin_id": "a",
+            "status": "success",
+            "meta": {"destination": "Penang", "num_days": 3},
+        }
+    ]
+
+    assert asyncio.run(itinerary.delete_itinerary("a")) == {
+        "status": "deleted",
+        "itin_id": "a",
+    }
+    assert _listed() == []
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(itinerary.load_itinerary("a"))
+
+
+def test_index_rebuilt_when_missing(storage_dir):
+    for itin_id in ("a", "b"):
+        asyncio.run(itinerary.save_itinerary(itin_id, _itinerary()))
+    itinerary.get_index_path().unlink()
+
+    assert sorted(e["itin_id"] for e in _listed()) == ["a", "b"]
+    assert itinerary.get_index_path().exists()
+
+
+def test_concurrent_saves(storage_dir):
+    async def save_all():
+        await asyncio.gather(
+            *(itinerary.save_itinerary("c", _itinerary(i)) for i in range(20)),
+            *(itinerary.save_itinerary(f"d{i}", _itinerary(i)) for i in range(20)),
+        )
+
+    asyncio.run(save_all())
+
+    assert asyncio.run(itinerary.load_itinerary("c"))["status"] == "success"
+    assert len(_listed()) == 21
+    # No temp files left behind by the atomic writes
+    assert not list(storage_dir.glob("*.tmp"))
+
+
+def test_rebuild_scans_only_readable_itineraries(storage_dir):
+    asyncio.run(itinerary.save_itinerary("a", _itinerary()))
+    # Same itinerary also left as legacy JSON: the compressed copy wins
+    (storage_dir / "a.json").write_bytes(orjson.dumps({"status": "stale"}))
+    (storage_dir / "broken.json.zst").write_bytes(b"not zstd")
+    (storage_dir / "notes.txt").write_text("ignored")
+    itinerary.get_index_path().unlink()
+
+    assert _listed() == [
+        {
+            "itin_id": "a",
+            "status": "success",
+            "meta": {"destination": "Penang", "num_days": 0},
+        }
+    ]
+
+
+def test_read_itinerary_file_from_mmap(storage_dir):
+    data = _itinerary(2)
+    data["plan"]["note"] = "Kek Lok Si 极乐寺"
+    asyncio.run(itinerary.save_itinerary("a", data))
+    legacy_path = storage_dir / "b.json"
+    legacy_path.write_bytes(orjson.dumps(data))
+
+    assert itinerary._read_itinerary_file(itinerary.get_itinerary_path("a")) == data
+    assert itinerary._read_itinerary_file(legacy_path) == data
+
+
+def test_zstd_format_and_legacy_migration(storage_dir):
+    legacy = _itinerary(1)
+    legacy_path = storage_dir / "old.json"
+    legacy_path.write_bytes(orjson.dumps(legacy))
+
+    # Legacy plain JSON is still readable and indexed
+    assert asyncio.run(itinerary.load_itinerary("old")) == legacy
+    assert [e["itin_id"] for e in _listed()] == ["old"]
+
+    # Saving migrates it to zstd and removes the legacy copy
+    updated = _itinerary(2)
+    asyncio.run(itinerary.save_itinerary("old", updated))
+    assert not legacy_path.exists()
+    stored = itinerary.get_itinerary_path("old").read_bytes()
+    assert stored[:4] == b"\x28\xb5\x2f\xfd"  # zstd frame magic
+    assert orjson.loads(zstd.decompress(stored)) == updated
+    assert asyncio.run(itinerary.load_itinerary("old")) == updated
+    assert [e["meta"]["num_days"] for e in _listed()] == [2]
+
+
+def _kill_own_worker() -> None:
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+@pytest.fixture
+def pipeline_pool(monkeypatch):
+    monkeypatch.setattr(itinerary, "_pipeline_pool", itinerary._new_pipeline_pool())
+    yield
+    itinerary.shutdown_pipeline_pool()
+
+
+def test_pipeline_pool_recovers_from_dead_worker(pipeline_pool):
+    async def run():
+        first_pool = itinerary._pipeline_pool
+        worker_pid = await itinerary._run_in_pipeline_pool(os.getpid)
+
+        # A job that takes its worker down fails only that request...
+        with pytest.raises(BrokenProcessPool):
+            await itinerary._run_in_pipeline_pool(_kill_own_worker)
+
+        # ...and the next request runs on a fresh pool
+        assert itinerary._pipeline_pool is not first_pool
+        assert await itinerary._run_in_pipeline_pool(os.getpid) != worker_pid
+
+    asyncio.run(run())
+
+
+def test_pipeline_request_after_worker_killed_succeeds(pipeline_pool):
+    async def run():
+        worker_pid = await itinerary._run_in_pipeline_pool(os.getpid)
+        os.kill(worker_pid, signal.SIGKILL)  # e.g. the OOM killer
+
+        assert await itinerary._run_in_pipeline_pool(os.getpid) != worker_pid
+
+    asyncio.run(run())
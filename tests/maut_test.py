@@ -1,6 +1,6 @@
 import os
 import json
-from app.services.maut import run_pipeline
+from app.services.maut import run_pipeline, score_row, score_rows
 
 MAUT_TEST_PATH = os.path.join(os.path.dirname(__file__), "maut_test.json")
 
@@ -58,5 +58,40 @@ def test_maut_pipeline():
     print(f"   Count out: {meta.get('count_out', 0)}")
 
 
+def test_score_rows_matches_score_row():
+    req = {
+        "flags": {"has_child": True, "wheelchair_accessible": True},
+        "dietary_restrictions": ["halal"],
+        "budget_tier": "sensible",
+    }
+    selected_themes = ["shopping", "cultural_history", "nature"]
+    rows = [
+        {
+            "id": "a",
+            "poi_roles": ["attraction"],
+            "themes": ["nature", "shopping"],
+            "price_level": 1.0,
+            "review_rating": 4.5,
+            "review_count": 1200,
+            "kids_friendly": True,
+        },
+        {
+            "id": "m",
+            "poi_roles": ["meal"],
+            "price_level": None,
+            "review_rating": 3.9,
+            "review_count": 0,
+            "halal_food": True,
+            "wheelchair_accessible_toilet": True,
+        },
+        {"id": "h", "poi_roles": ["accommodation"], "review_rating": None},
+        {"id": "x", "poi_roles": None, "price_level": 4.0, "review_count": 40},
+    ]
+
+    scores = score_rows(req, rows, selected_themes)
+
+    assert scores.tolist() == [score_row(req, r, selected_themes) for r in rows]
+
+
 if __name__ == "__main__":
     test_maut_pipeline()
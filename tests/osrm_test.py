@@ -0,0 +1,151 @@
+import pytest
+import requests
+from app.services import osrm
+from app.services.osrm import OSRMClient, _CircuitBreaker
+
+
+class FakeTime:
+    """Stands in for the time module inside osrm: a clock moved by hand."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeRandom:
+    """Records the jitter bounds and picks the middle of the range."""
+
+    def __init__(self):
+        self.bounds = []
+
+    def uniform(self, a: float, b: float) -> float:
+        self.bounds.append((a, b))
+        return (a + b) / 2
+
+
+class StubResponse:
+    def __init__(self, status_code: int):
+        self.status_code = status_code
+
+
+class StubSession:
+    """requests.Session stand-in replaying canned status codes / exceptions."""
+
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, timeout=None):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return StubResponse(outcome)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeTime()
+    monkeypatch.setattr(osrm, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def jitter(monkeypatch):
+    fake = FakeRandom()
+    monkeypatch.setattr(osrm, "random", fake)
+    return fake
+
+
+def _client(outcomes, breaker=None) -> OSRMClient:
+    client = OSRMClient(base_url="http://osrm.test")
+    client._session = StubSession(outcomes)
+    client._breaker = breaker or _CircuitBreaker(failure_threshold=3)
+    return client
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = _CircuitBreaker(failure_threshold=3, recovery_time=30.0)
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert not breaker.allow()
+    clock.now += 29.9
+    assert not breaker.allow()
+
+
+def test_breaker_half_open_after_cooldown(clock):
+    breaker = _CircuitBreaker(failure_threshold=2, recovery_time=30.0)
+    breaker.record_failure()
+    breaker.record_failure()
+
+    # Half-open: one failure re-opens it for a full cooldown
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    # Half-open again: one success closes it and resets the count
+    clock.now += 30.0
+    assert breaker.allow()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allow()
+
+
+def test_get_retries_connection_error_with_jitter(clock, jitter):
+    client = _client([requests.exceptions.ConnectionError(), 200])
+
+    resp = client._get("http://osrm.test/route")
+
+    assert resp.status_code == 200
+    assert client._session.calls == 2
+    # Full jitter: U(0, min(cap, base * 2**attempt)) before the second try
+    assert jitter.bounds == [(0, osrm.OSRM_BACKOFF_BASE_SEC * 2)]
+    assert clock.sleeps == [osrm.OSRM_BACKOFF_BASE_SEC]
+    assert client._breaker._failures == 0  # the success closed it again
+
+
+def test_get_returns_last_5xx_after_retries(clock, jitter):
+    client = _client([503, 502])
+
+    resp = client._get("http://osrm.test/route")
+
+    assert resp.status_code == 502
+    assert client._session.calls == osrm.OSRM_MAX_ATTEMPTS
+    assert client._breaker._failures == 2
+
+
+def test_get_does_not_retry_timeouts(clock, jitter):
+    client = _client([requests.exceptions.Timeout()])
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client._get("http://osrm.test/route")
+
+    assert client._session.calls == 1
+    assert clock.sleeps == []
+    assert client._breaker._failures == 1
+
+
+def test_get_stops_retrying_once_breaker_opens(clock, jitter):
+    client = _client(
+        [requests.exceptions.ConnectionError()],
+        breaker=_CircuitBreaker(failure_threshold=1),
+    )
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client._get("http://osrm.test/route")
+
+    assert client._session.calls == 1
+    assert clock.sleeps == []
+    assert not client._breaker.allow()
@@ -0,0 +1,56 @@
+import orjson
+import pytest
+from cachetools import TTLCache
+from app.api import pois
+
+
+class FakeSupabase:
+    """Answers table("pois").select().eq().single().execute() with one row."""
+
+    def __init__(self, row):
+        self.row = row
+        self.queries = 0
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.queries += 1
+        return type("Resp", (), {"data": self.row})()
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    fake = FakeSupabase(
+        {
+            "id": "p1",
+            "name": "Penang Hill",
+            "images": ["a.jpg"],
+            "latitude": 5.42,
+            "longitude": 100.27,
+        }
+    )
+    monkeypatch.setattr(pois, "get_supabase", lambda: fake)
+    monkeypatch.setattr(pois, "_poi_cache", TTLCache(maxsize=8, ttl=300))
+    return fake
+
+
+def test_get_poi_by_id_returns_fresh_copies(supabase):
+    first = pois.get_poi_by_id("p1")
+    first["data"]["images"].append("mutated.jpg")
+    first["data"]["name"] = "changed"
+
+    second = pois.get_poi_by_id("p1")
+
+    assert supabase.queries == 1
+    assert second["data"]["images"] == ["a.jpg"]
+    assert second["data"]["name"] == "Penang Hill"
+    assert orjson.loads(pois.get_poi("p1").body) == second
+
+
+def test_get_poi_not_found(supabase):
+    supabase.row = None
+
+    assert pois.get_poi_by_id("missing") is None
+    with pytest.raises(pois.HTTPException):
+        pois.get_poi("missing")